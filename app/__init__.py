@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from config import Config
+from app.prewarm import configure_numba_cache
 import os
 
 db = SQLAlchemy()
@@ -22,10 +23,14 @@ def create_app():
     login_manager.login_message_category = 'info'
 
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    configure_numba_cache(app.config['NUMBA_CACHE_DIR'])
 
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from app.cli import soundsep
+    app.cli.add_command(soundsep)
+
     return app
 
 from app import models   # noqa: E402  (circular import fix)
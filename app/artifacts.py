@@ -0,0 +1,154 @@
+import os
+import io
+import json
+import zlib
+import shutil
+import numpy as np
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+CHUNK_FRAMES = 4096
+ENCODINGS = ('float32', 'float16', 'q8')
+
+def _encode(array, encoding):
+    if encoding == 'float16':
+        return array.astype(np.float16), {}
+    if encoding == 'q8':
+        lo, hi = float(np.min(array)), float(np.max(array))
+        scale = (hi - lo) / 255.0 or 1.0
+        return np.round((array - lo) / scale).astype(np.uint8), {'scale': scale, 'offset': lo}
+    return array.astype(np.float32) if array.dtype == np.float64 else array, {}
+
+def _write_chunk(root, name, data, compress):
+    if compress:
+        buf = io.BytesIO()
+        np.save(buf, np.ascontiguousarray(data))
+        name = f'{name}.npy.z'
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(zlib.compress(buf.getvalue(), 6))
+    else:
+        name = f'{name}.npy'
+        np.save(os.path.join(root, name), np.ascontiguousarray(data))
+    return name
+
+def write_artifact(root, arrays, metrics, time_axes, encodings=None, compress=False, chunk_frames=CHUNK_FRAMES):
+    # Arrays with a time axis are split into chunk_frames-wide files so readers can
+    # map just the window they need; everything lands in place with one rename.
+    encodings = encodings or {}
+    tmp_root = f'{root}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    os.makedirs(tmp_root)
+    manifest = {'format_version': FORMAT_VERSION, 'chunk_frames': chunk_frames, 'metrics': metrics, 'arrays': {}}
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        encoding = encodings.get(name, 'float32' if array.dtype.kind == 'f' else 'raw')
+        stored, params = _encode(array, encoding) if encoding != 'raw' else (array, {})
+        axis = time_axes.get(name)
+        spec = dict(params, shape=list(array.shape), dtype='float32' if encoding == 'q8' else str(array.dtype),
+                    encoding=encoding, stored_dtype=str(stored.dtype), time_axis=axis, chunks=[])
+        if axis is None:
+            spec['chunks'].append({'start': 0, 'stop': 0, 'file': _write_chunk(tmp_root, name, stored, False)})
+        else:
+            for start in range(0, max(array.shape[axis], 1), chunk_frames):
+                stop = min(start + chunk_frames, array.shape[axis])
+                index = [slice(None)] * stored.ndim
+                index[axis] = slice(start, stop)
+                block = stored[tuple(index)]
+                spec['chunks'].append({'start': start, 'stop': stop,
+                                       'file': _write_chunk(tmp_root, f'{name}.{start // chunk_frames:05d}', block, compress)})
+        manifest['arrays'][name] = spec
+    with open(os.path.join(tmp_root, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+    old_root = f'{root}.{os.getpid()}.old'
+    if os.path.exists(root):
+        os.replace(root, old_root)
+    os.replace(tmp_root, root)
+    shutil.rmtree(old_root, ignore_errors=True)
+    return manifest
+
+class ChunkedArray:
+    # Lazy handle on one stored array; slicing along the time axis reads only the
+    # chunks it touches and returns a memory-mapped view when it stays inside one.
+    def __init__(self, artifact, name):
+        self.artifact = artifact
+        self.name = name
+        self.spec = artifact.manifest['arrays'][name]
+        self.shape = tuple(self.spec['shape'])
+        self.ndim = len(self.shape)
+        self.dtype = np.dtype(self.spec['dtype'] if self.spec['encoding'] == 'q8' else self.spec['stored_dtype'])
+        self.time_axis = self.spec['time_axis']
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read()
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        axis = self.time_axis
+        if axis is not None and len(key) > axis and isinstance(key[axis], slice) and key[axis].step in (None, 1):
+            start, stop, _ = key[axis].indices(self.shape[axis])
+            rest = key[:axis] + (slice(None),) + key[axis + 1:]
+            return self.read(start, stop)[rest]
+        return self.read()[key]
+
+    def _load(self, chunk):
+        path = os.path.join(self.artifact.root, chunk['file'])
+        if path.endswith('.z'):
+            with open(path, 'rb') as f:
+                return np.load(io.BytesIO(zlib.decompress(f.read())))
+        return np.load(path, mmap_mode='r')
+
+    def read(self, start=None, stop=None, decode=True):
+        chunks = self.spec['chunks']
+        axis = self.time_axis
+        if axis is None:
+            data = self._load(chunks[0])
+        else:
+            start = 0 if start is None else max(start, 0)
+            stop = self.shape[axis] if stop is None else min(stop, self.shape[axis])
+            stop = max(start, stop)
+            parts = []
+            for chunk in chunks:
+                if chunk['stop'] <= start or chunk['start'] >= stop:
+                    continue
+                index = [slice(None)] * self.ndim
+                index[axis] = slice(max(start - chunk['start'], 0), min(stop, chunk['stop']) - chunk['start'])
+                parts.append(self._load(chunk)[tuple(index)])
+            if not parts:
+                shape = list(self.shape)
+                shape[axis] = 0
+                return np.empty(shape, dtype=self.dtype)
+            data = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=axis)
+        if decode and self.spec['encoding'] == 'q8':
+            return data.astype(np.float32) * np.float32(self.spec['scale']) + np.float32(self.spec['offset'])
+        return data
+
+class Artifact:
+    def __init__(self, root):
+        self.root = root
+        with open(os.path.join(root, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+    @property
+    def metrics(self):
+        return self.manifest['metrics']
+
+    @property
+    def names(self):
+        return tuple(self.manifest['arrays'])
+
+    def array(self, name):
+        return ChunkedArray(self, name)
+
+    def read(self, name, start=None, stop=None, decode=True):
+        return ChunkedArray(self, name).read(start, stop, decode=decode)
+
+    def nbytes(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.root) if entry.is_file())
+
+def open_artifact(root):
+    return Artifact(root)
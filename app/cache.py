@@ -0,0 +1,153 @@
+import os
+import json
+import uuid
+import hashlib
+import numpy as np
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import AnalysisResult, CacheStat
+from app.uploads import hash_file
+
+MEMO_PARAMS = ('n_components', 'max_iterations', 'sample_rate', 'solver', 'seed', 'n_restarts',
+               'dictionary_version')
+
+def record(name, hit):
+    column = 'hits' if hit else 'misses'
+    updated = CacheStat.query.filter_by(name=name).update(
+        {column: getattr(CacheStat, column) + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CacheStat(name=name, hits=int(hit), misses=int(not hit)))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        record(name, hit)
+
+def cache_stats():
+    stats = {}
+    for stat in CacheStat.query.all():
+        total = stat.hits + stat.misses
+        stats[stat.name] = {
+            'hits': stat.hits,
+            'misses': stat.misses,
+            'hit_rate': stat.hits / total if total else 0.0
+        }
+    return stats
+
+class DiskCache:
+    def __init__(self, name, root, max_bytes):
+        self.name = name
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def path_for(self, key, name):
+        return os.path.join(self.root, f'{key}_{name}.npy')
+
+    def get_arrays(self, key, names, mmap_mode='r'):
+        arrays = {}
+        try:
+            for name in names:
+                path = self.path_for(key, name)
+                arrays[name] = np.load(path, mmap_mode=mmap_mode)
+                os.utime(path)
+        except FileNotFoundError:
+            arrays = None
+        record(self.name, arrays is not None)
+        return arrays
+
+    def put_arrays(self, key, arrays):
+        os.makedirs(self.root, exist_ok=True)
+        for name, array in arrays.items():
+            path = self.path_for(key, name)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        # An entry is every '{key}_{name}.npy' file of one key, and goes as a unit: a
+        # features entry missing 'mag' is useless but would still count against max_bytes.
+        groups = {}
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.endswith('.npy'):
+                stat = entry.stat()
+                group = groups.setdefault(entry.name[:-4].rsplit('_', 1)[0], {'used': 0.0, 'size': 0, 'paths': []})
+                group['used'] = max(group['used'], stat.st_mtime)
+                group['size'] += stat.st_size
+                group['paths'].append(entry.path)
+        total = sum(group['size'] for group in groups.values())
+        for group in sorted(groups.values(), key=lambda group: group['used']):
+            if total <= self.max_bytes:
+                break
+            for path in group['paths']:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= group['size']
+
+def disk_cache(name):
+    return DiskCache(
+        name,
+        os.path.join(current_app.config['CACHE_FOLDER'], name),
+        current_app.config[f'{name.upper()}_CACHE_MAX_BYTES']
+    )
+
+def result_cache_key(content_hash, params):
+    normalized = {name: params.get(name) for name in MEMO_PARAMS}
+    normalized['solver'] = normalized['solver'] or 'mu'
+    normalized['n_restarts'] = normalized['n_restarts'] or 1
+    payload = json.dumps({'content': content_hash, 'params': normalized}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def memo_key(audio_file):
+    if not audio_file.content_hash:
+        audio_file.content_hash = hash_file(audio_file.file_path)
+    return result_cache_key(audio_file.content_hash, json.loads(audio_file.processing_params))
+
+def lookup_result(key):
+    entry = AnalysisResult.query.filter_by(cache_key=key).first()
+    record('results', entry is not None)
+    if entry:
+        entry.last_used_at = datetime.utcnow()
+        entry.hit_count = (entry.hit_count or 0) + 1
+    return entry
+
+def link_result(audio_file, entry):
+    analysis = audio_file.analysis or AnalysisResult(audio_file_id=audio_file.id)
+    for column in ('result_dir', 'arrays_path', 'sr', 'metrics', 'spectrogram_path',
+                   'nmf_path', 'cluster_path', 'summary_path'):
+        setattr(analysis, column, getattr(entry, column))
+    db.session.add(analysis)
+    return analysis
+
+def remember_result(analysis, key):
+    AnalysisResult.query.filter(
+        AnalysisResult.cache_key == key, AnalysisResult.id != analysis.id
+    ).update({'cache_key': None}, synchronize_session=False)
+    analysis.cache_key = key
+    analysis.last_used_at = datetime.utcnow()
+    evict_results()
+
+def evict_results():
+    limit = current_app.config['RESULT_CACHE_MAX_ENTRIES']
+    cached = AnalysisResult.query.filter(AnalysisResult.cache_key.isnot(None))
+    excess = cached.count() - limit
+    if excess > 0:
+        for entry in cached.order_by(AnalysisResult.last_used_at.asc()).limit(excess).all():
+            entry.cache_key = None
+
+def release_result(analysis):
+    # Artifacts may be shared with memoized copies; hand them over instead of deleting.
+    sharing = AnalysisResult.query.filter(
+        AnalysisResult.result_dir == analysis.result_dir, AnalysisResult.id != analysis.id
+    ).first()
+    if sharing and analysis.cache_key:
+        sharing.cache_key = analysis.cache_key
+        sharing.last_used_at = analysis.last_used_at
+        analysis.cache_key = None
+    return sharing is None
@@ -0,0 +1,286 @@
+import os
+import csv
+import json
+import glob
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert
+from app import db
+from app.models import User, AudioFile, AnalysisResult
+from app.solvers import SOLVERS, DICTIONARY_SOLVERS
+
+soundsep = AppGroup('soundsep', help='SoundSeparator batch and maintenance commands.')
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac')
+SUMMARY_FIELDS = (
+    'file_path', 'success', 'error', 'duration', 'sample_rate', 'native_sample_rate',
+    'n_components', 'solver', 'n_iter', 'final_loss', 'cluster_0_count', 'cluster_1_count',
+    'cluster_ratio', 'decode_time', 'stft_time', 'nmf_time', 'clustering_time', 'total_time',
+    'file_size', 'content_hash',
+)
+
+def expand_inputs(inputs):
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.update(os.path.join(root, name) for name in files
+                             if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            paths.update(path for path in glob.glob(item, recursive=True)
+                         if path.lower().endswith(AUDIO_EXTENSIONS))
+    return sorted(paths)
+
+def analyse_file(task):
+    # One unreadable file must not end an overnight batch: every failure becomes a row.
+    file_path, params = task
+    try:
+        return _analyse_file(file_path, params)
+    except Exception as e:
+        return {'file_path': file_path, 'success': False, 'error': f'{type(e).__name__}: {e}'}
+
+def _analyse_file(file_path, params):
+    from app.processor import process_audio, probe_audio
+    from app.uploads import hash_file
+    from app.dictionary import load_dictionary
+    dictionary = None
+    if params['solver'] in DICTIONARY_SOLVERS:
+        dictionary = load_dictionary(params['dictionary_folder'], params['sample_rate'], params['dictionary_version'])
+    marks = []
+    start = time.perf_counter()
+    result = process_audio(
+        file_path,
+        n_components=params['n_components'],
+        max_iter=params['max_iterations'],
+        sr=params['sample_rate'],
+        solver=params['solver'],
+        tol=params['tol'],
+        seed=params['seed'],
+        n_restarts=params['n_restarts'],
+        dictionary=dictionary,
+        n_free=params['n_free'],
+        blas_threads=params['blas_threads'],
+        progress=lambda stage, fraction: marks.append((stage, time.perf_counter()))
+    )
+    end = time.perf_counter()
+    summary = {'file_path': file_path, 'success': result['success'], 'error': result.get('error'),
+               'total_time': end - start}
+    if not result['success'] and not summary['error']:
+        summary['error'] = 'Could not decode or process the file'
+    for (stage, started), (_, finished) in zip(marks, marks[1:] + [(None, end)]):
+        summary[f'{stage}_time'] = finished - started
+    if result['success']:
+        metrics = result['results']
+        for key in ('duration', 'n_components', 'solver', 'n_iter', 'final_loss',
+                    'cluster_0_count', 'cluster_1_count', 'cluster_ratio'):
+            summary[key] = metrics[key]
+        summary['sample_rate'] = metrics['sr']
+    probed = probe_audio(file_path)
+    summary['native_sample_rate'] = probed[0] if probed else None
+    summary['file_size'] = os.path.getsize(file_path)
+    summary['content_hash'] = hash_file(file_path)
+    return summary
+
+class SummaryWriter:
+    def __init__(self, path):
+        self.jsonl = path.lower().endswith('.jsonl')
+        self.file = open(path, 'w', newline='')
+        if not self.jsonl:
+            self.csv = csv.DictWriter(self.file, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, summary):
+        if self.jsonl:
+            self.file.write(json.dumps(summary) + '\n')
+        else:
+            self.csv.writerow(summary)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def register_files(summaries, user, params):
+    rows = [{
+        'filename': os.path.basename(s['file_path']),
+        'original_filename': os.path.basename(s['file_path']),
+        'file_path': s['file_path'],
+        'file_size': s['file_size'],
+        'content_hash': s['content_hash'],
+        'sample_rate': s['native_sample_rate'],
+        'duration': s.get('duration'),
+        'processed': False,
+        'processing_params': json.dumps({
+            'n_components': params['n_components'],
+            'max_iterations': params['max_iterations'],
+            'sample_rate': params['sample_rate'],
+            'solver': params['solver'],
+            'seed': params['seed'],
+            'n_restarts': params['n_restarts'],
+            'dictionary_version': params['dictionary_version'],
+            'description': 'Batch import'
+        }),
+        'user_id': user.id,
+    } for s in summaries if s['success']]
+    if rows:
+        db.session.execute(insert(AudioFile), rows)
+        db.session.commit()
+    return len(rows)
+
+@soundsep.command('batch')
+@click.argument('inputs', nargs=-1, required=True)
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False),
+              help='Summary file; .jsonl for JSON lines, anything else for CSV.')
+@click.option('--workers', '-w', default=os.cpu_count() or 1, show_default=True)
+@click.option('--n-components', default=8, show_default=True)
+@click.option('--max-iterations', default=5000, show_default=True)
+@click.option('--sample-rate', default=16000, show_default=True)
+@click.option('--solver', default='mu32', show_default=True,
+              type=click.Choice(list(SOLVERS) + list(DICTIONARY_SOLVERS)))
+@click.option('--seed', default=0, show_default=True)
+@click.option('--restarts', 'n_restarts', default=1, show_default=True,
+              help='NMF restarts per file; the lowest-divergence run is kept.')
+@click.option('--blas-threads', default=1, show_default=True,
+              help='BLAS threads per worker process.')
+@click.option('--register', 'register_user', default=None,
+              help='Username to register the analysed files under as AudioFile rows.')
+@click.option('--batch-size', default=500, show_default=True, help='Rows per bulk insert.')
+def batch(inputs, output, workers, n_components, max_iterations, sample_rate, solver, seed,
+          n_restarts, blas_threads, register_user, batch_size):
+    """Analyse directories or globs of recordings in a process pool."""
+    from flask import current_app
+    user = None
+    if register_user:
+        user = User.query.filter_by(username=register_user).first()
+        if user is None:
+            raise click.BadParameter(f'No user named {register_user}', param_hint='--register')
+    paths = expand_inputs(inputs)
+    if not paths:
+        raise click.UsageError('No wav/mp3/flac files matched the given inputs.')
+    dictionary_version = None
+    if solver in DICTIONARY_SOLVERS:
+        from app.dictionary import load_dictionary
+        try:
+            dictionary = load_dictionary(current_app.config['DICTIONARY_FOLDER'], sample_rate)
+        except FileNotFoundError as e:
+            raise click.ClickException(f"{e}; build one with 'flask soundsep dictionary build'")
+        n_components = dictionary.W.shape[1] + current_app.config['DICTIONARY_FREE_COMPONENTS']
+        dictionary_version = dictionary.version
+    params = {
+        'n_components': n_components, 'max_iterations': max_iterations,
+        'sample_rate': sample_rate, 'solver': solver, 'seed': seed, 'n_restarts': n_restarts,
+        'tol': current_app.config['NMF_TOL'], 'blas_threads': blas_threads,
+        'dictionary_folder': current_app.config['DICTIONARY_FOLDER'],
+        'dictionary_version': dictionary_version,
+        'n_free': current_app.config['DICTIONARY_FREE_COMPONENTS'],
+    }
+    click.echo(f'Analysing {len(paths)} files with {workers} workers')
+    writer = SummaryWriter(output)
+    pending, registered, failed = [], 0, 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(analyse_file, (path, params)) for path in paths]
+            for done, future in enumerate(as_completed(futures), 1):
+                summary = future.result()
+                writer.write(summary)
+                failed += not summary['success']
+                click.echo(f"[{done}/{len(paths)}] {summary['file_path']}: "
+                           f"{'ok' if summary['success'] else summary['error']}")
+                if user:
+                    pending.append(summary)
+                    if len(pending) >= batch_size:
+                        registered += register_files(pending, user, params)
+                        pending = []
+        if user:
+            registered += register_files(pending, user, params)
+    finally:
+        writer.close()
+    click.echo(f'Done: {len(paths) - failed} analysed, {failed} failed, {registered} registered')
+
+@soundsep.group('dictionary')
+def dictionary_cli():
+    """Build and inspect the heart/lung component dictionary."""
+
+@dictionary_cli.command('build')
+@click.option('--sample-rate', default=16000, show_default=True)
+@click.option('--templates', default=8, show_default=True, help='Templates kept per class.')
+@click.option('--limit', default=None, type=int, help='Only use the most recent N analyses.')
+def dictionary_build(sample_rate, templates, limit):
+    """Aggregate W columns of processed recordings into a new dictionary version."""
+    from flask import current_app
+    from app.dictionary import build_dictionary
+    analyses = AnalysisResult.query.filter_by(sr=sample_rate).order_by(AnalysisResult.id.desc())
+    if limit:
+        analyses = analyses.limit(limit)
+    try:
+        built = build_dictionary(analyses.all(), current_app.config['DICTIONARY_FOLDER'], sample_rate,
+                                 n_templates=templates)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    counts = {name: int((built.classes == name).sum()) for name in ('heart', 'lung')}
+    click.echo(f"Built dictionary v{built.version} at {built.path}: "
+               f"{counts['heart']} heart, {counts['lung']} lung templates")
+
+@dictionary_cli.command('list')
+@click.option('--sample-rate', default=16000, show_default=True)
+def dictionary_list(sample_rate):
+    """List the dictionary versions available for a sample rate."""
+    from flask import current_app
+    from app.dictionary import versions, load_dictionary
+    folder = current_app.config['DICTIONARY_FOLDER']
+    for version in versions(folder, sample_rate):
+        entry = load_dictionary(folder, sample_rate, version)
+        click.echo(f'v{version}: {entry.W.shape[1]} templates ({entry.path})')
+
+@soundsep.command('worker')
+@click.option('--burst', is_flag=True, help='Exit once no job is left to claim.')
+@click.option('--max-jobs', default=None, type=int, help='Exit after processing this many jobs.')
+def worker(burst, max_jobs):
+    """Claim and process queued jobs; run one per core on as many hosts as needed."""
+    from flask import current_app
+    from app.jobs import work, worker_id, prewarm_worker
+    owner = worker_id()
+    if current_app.config['PREWARM_WORKERS']:
+        prewarm_worker(current_app)
+    click.echo(f'Worker {owner} waiting for jobs')
+    done = work(owner, burst=burst, max_jobs=max_jobs)
+    click.echo(f'Worker {owner} processed {done} jobs')
+
+@soundsep.command('expire-uploads')
+@click.option('--max-age', default=None, type=int,
+              help='Seconds since the last chunk; defaults to UPLOAD_SESSION_MAX_AGE.')
+def expire_uploads_cli(max_age):
+    """Delete resumable uploads that were abandoned part-way, with their partial files."""
+    from flask import current_app
+    from app.uploads import expire_uploads
+    expired = expire_uploads(current_app.config['UPLOAD_SESSION_MAX_AGE'] if max_age is None else max_age)
+    click.echo(f'Expired {expired} abandoned uploads')
+
+HEAVY_MODULES = ('librosa', 'numba', 'scipy', 'sklearn', 'matplotlib', 'soundfile', 'audioread')
+STARTUP_PROBE = (
+    'import sys, time\n'
+    'start = time.perf_counter()\n'
+    'from app import create_app\n'
+    'create_app()\n'
+    'print(time.perf_counter() - start)\n'
+    'print(",".join(name for name in {modules!r} if name in sys.modules))\n'
+)
+
+@soundsep.command('prewarm')
+@click.option('--sample-rate', default=16000, show_default=True)
+def prewarm_cli(sample_rate):
+    """Report start-up time, then warm the processing stack and time each stage."""
+    import sys
+    import subprocess
+    from app.prewarm import prewarm
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    probe = subprocess.run([sys.executable, '-c', STARTUP_PROBE.format(modules=HEAVY_MODULES)],
+                           capture_output=True, text=True, cwd=root, check=True).stdout.splitlines()
+    click.echo(f'create_app() in a fresh process: {float(probe[0]):.2f} s, '
+               f'heavy modules loaded: {probe[1] if len(probe) > 1 and probe[1] else "none"}')
+    click.echo(f"numba cache: {os.environ.get('NUMBA_CACHE_DIR', 'next to the librosa sources')}")
+    for label in ('first pass', 'second pass'):
+        timings = prewarm(sample_rate)
+        click.echo(f'{label}: ' + ', '.join(f'{name} {seconds:.2f} s' for name, seconds in timings.items()))
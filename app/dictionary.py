@@ -0,0 +1,85 @@
+import os
+import glob
+import functools
+from collections import namedtuple
+import numpy as np
+
+EPS = 1e-10
+# Heart sounds sit mostly below ~200 Hz; breath sounds spread well above it.
+HEART_CUTOFF_HZ = 200.0
+COMPONENT_CLASSES = ('heart', 'lung')
+
+Dictionary = namedtuple('Dictionary', 'W classes sr version path')
+
+def component_classes(W, sr):
+    # Median frequency of each template; a mean would be dragged up by the broadband floor.
+    freqs = np.linspace(0, sr / 2, W.shape[0])
+    cumulative = np.cumsum(W, axis=0) / (W.sum(axis=0) + EPS)
+    median = freqs[np.minimum((cumulative < 0.5).sum(axis=0), len(freqs) - 1)]
+    return np.where(median < HEART_CUTOFF_HZ, 'heart', 'lung')
+
+def dictionary_path(folder, sr, version):
+    return os.path.join(folder, f'sr{sr}', f'v{version:04d}.npz')
+
+def versions(folder, sr):
+    paths = glob.glob(os.path.join(folder, f'sr{sr}', 'v*.npz'))
+    return sorted(int(os.path.basename(path)[1:-4]) for path in paths)
+
+def latest_version(folder, sr):
+    found = versions(folder, sr)
+    return found[-1] if found else None
+
+@functools.lru_cache(maxsize=16)
+def _read(path):
+    with np.load(path) as data:
+        W = data['W']
+        W.setflags(write=False)
+        return Dictionary(W, data['classes'].astype(str), int(data['sr']), int(data['version']), path)
+
+def load_dictionary(folder, sr, version=None):
+    version = version or latest_version(folder, sr)
+    if version is None:
+        raise FileNotFoundError(f'No component dictionary for {sr} Hz in {folder}')
+    path = dictionary_path(folder, sr, version)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Component dictionary v{version} for {sr} Hz not found')
+    return _read(path)
+
+def build_dictionary(analyses, folder, sr, n_templates=8, seed=0):
+    from sklearn.cluster import KMeans
+    from app.result_store import load_arrays
+    columns, seen = [], set()
+    for analysis in analyses:
+        # Memoized copies of a recording share its arrays; count each W once.
+        if analysis.arrays_path in seen:
+            continue
+        seen.add(analysis.arrays_path)
+        arrays = load_arrays(analysis, ('W',))
+        # Columns copied from an earlier dictionary would only echo it back.
+        W = arrays['W'][:, arrays['metrics'].get('n_fixed', 0):]
+        columns.append(W / (W.sum(axis=0) + EPS))
+    if not columns:
+        raise ValueError(f'No processed recordings at {sr} Hz to build a dictionary from')
+    W = np.hstack(columns)
+    classes = component_classes(W, sr)
+
+    templates, labels = [], []
+    for name in COMPONENT_CLASSES:
+        members = W[:, classes == name]
+        if not members.shape[1]:
+            continue
+        k = min(n_templates, members.shape[1])
+        centers = KMeans(n_clusters=k, random_state=seed, n_init=10).fit(members.T).cluster_centers_.T
+        centers = np.maximum(centers, 0)
+        templates.append(centers / (centers.sum(axis=0) + EPS))
+        labels += [name] * k
+
+    version = (latest_version(folder, sr) or 0) + 1
+    path = dictionary_path(folder, sr, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, W=np.hstack(templates).astype(np.float32), classes=np.array(labels),
+                 sr=sr, version=version, sources=len(columns))
+    os.replace(tmp_path, path)
+    return _read(path)
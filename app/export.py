@@ -0,0 +1,103 @@
+import io
+import math
+import zipfile
+import numpy as np
+from app.processor import HOP_LENGTH
+from app.result_store import load_arrays, open_array
+
+EXPORT_ARRAYS = ('H', 'labels', 'W')
+COMPRESSIONS = ('deflate', 'zstd', 'none')
+
+class _Sink(io.RawIOBase):
+    # Write-only, non-seekable target for ZipFile; the export drains it after each write.
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def frame_window(start, end, sr, n_frames, hop_length=HOP_LENGTH):
+    # Frame t of the centred STFT sits at t * hop / sr seconds; keep frames in [start, end).
+    first = 0 if start is None else min(n_frames, max(0, math.ceil(start * sr / hop_length)))
+    stop = n_frames if end is None else min(n_frames, max(first, math.ceil(end * sr / hop_length)))
+    return first, stop
+
+def zstd_compressor():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor(level=3).compressobj()
+
+def _npy_header(shape, dtype, fortran_order=False):
+    buf = io.BytesIO()
+    np.lib.format.write_array_header_2_0(buf, {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': fortran_order,
+        'shape': tuple(shape),
+    })
+    return buf.getvalue()
+
+def stream_npz(analysis, names, first, stop, components, compression='deflate', chunk_frames=8192):
+    # Yields an .npz archive piece by piece. Time-indexed arrays are read one window
+    # of chunk_frames at a time, so memory stays flat however long the recording is.
+    # H is written in Fortran order so that consecutive frames are contiguous in the file.
+    sink = _Sink()
+    zstd = zstd_compressor() if compression == 'zstd' else None
+    method = zipfile.ZIP_DEFLATED if compression == 'deflate' else zipfile.ZIP_STORED
+    emit = (lambda data: zstd.compress(data)) if zstd else (lambda data: data)
+    metrics = load_arrays(analysis, ())['metrics']
+    W = np.asarray(open_array(analysis, 'W'))
+    H, labels = open_array(analysis, 'H'), open_array(analysis, 'labels')
+    components = np.asarray(components)
+    classes = metrics.get('component_classes') or [''] * W.shape[1]
+    meta = {
+        'sr': np.int64(analysis.sr),
+        'hop_length': np.int64(HOP_LENGTH),
+        'start_frame': np.int64(first),
+        'components': components.astype(np.int64),
+        'component_classes': np.array([classes[i] for i in components]),
+    }
+
+    with zipfile.ZipFile(sink, 'w', compression=method, allowZip64=True) as archive:
+        def member(name, header, blocks):
+            with archive.open(f'{name}.npy', 'w', force_zip64=True) as f:
+                f.write(header)
+                for block in blocks:
+                    f.write(block)
+                    yield emit(sink.drain())
+            yield emit(sink.drain())
+
+        def windows(array, axis):
+            for start in range(first, stop, chunk_frames):
+                index = [slice(None)] * axis + [slice(start, min(start + chunk_frames, stop))]
+                yield array[tuple(index)]
+
+        for name, value in meta.items():
+            yield from member(name, _npy_header(value.shape, value.dtype), [np.ascontiguousarray(value).tobytes()])
+        if 'W' in names:
+            W = np.ascontiguousarray(W[:, components])
+            yield from member('W', _npy_header(W.shape, W.dtype), [W.tobytes()])
+        if 'H' in names:
+            yield from member('H', _npy_header((len(components), stop - first), H.dtype, fortran_order=True),
+                              (np.ascontiguousarray(block[components].T).tobytes() for block in windows(H, 1)))
+        if 'labels' in names:
+            yield from member('labels', _npy_header((stop - first,), labels.dtype),
+                              (np.ascontiguousarray(block).tobytes() for block in windows(labels, 0)))
+    yield emit(sink.drain())
+    if zstd:
+        yield zstd.flush()
@@ -2,9 +2,9 @@ from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import (
     StringField, PasswordField, SubmitField, IntegerField,
-    SelectField, TextAreaField, BooleanField
+    SelectField, TextAreaField, BooleanField, FloatField
 )
-from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange
+from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange, Regexp
 
 class RegistrationForm(FlaskForm):
     first_name  = StringField('First Name', validators=[DataRequired(), Length(min=2, max=50)])
@@ -46,8 +46,31 @@ class UploadForm(FlaskForm):
     n_components  = IntegerField('Components',   default=8,    validators=[NumberRange(2, 20)])
     max_iterations= IntegerField('Iterations',   default=5000, validators=[NumberRange(100, 10000)])
     sample_rate   = IntegerField('Sample Rate',  default=16000,validators=[NumberRange(8000, 48000)])
+    solver        = SelectField('Solver', default='mu32', choices=[
+        ('mu32', 'Multiplicative Updates (KL, float32)'),
+        ('mu', 'Multiplicative Updates (KL, float64)'),
+        ('hals', 'HALS / Coordinate Descent'),
+        ('sklearn', 'scikit-learn NMF (KL, MU)'),
+        ('dict', 'Heart/lung dictionary, activations only (KL)'),
+        ('dict-warm', 'Heart/lung dictionary, warm start (KL)')
+    ])
+    n_restarts    = IntegerField('Restarts',     default=1,    validators=[NumberRange(1, 16)])
     submit        = SubmitField('Process Audio')
 
+class ChunkedUploadForm(UploadForm):
+    audio_file    = None   # the file itself arrives in PUT chunks
+    filename      = StringField('Filename', validators=[
+        DataRequired(), Length(max=255), Regexp(r'(?i).+\.(wav|mp3|flac)$', message='Audio only!')
+    ])
+    size          = IntegerField('Size', validators=[DataRequired(), NumberRange(min=1)])
+
+class EstimateForm(UploadForm):
+    class Meta:
+        csrf = False   # read-only GET
+
+    audio_file    = None
+    duration      = FloatField('Duration', validators=[DataRequired(), NumberRange(min=0.1)])
+
 class ProfileForm(FlaskForm):
     first_name  = StringField(validators=[DataRequired(), Length(min=2, max=50)])
     last_name   = StringField(validators=[DataRequired(), Length(min=2, max=50)])
@@ -0,0 +1,99 @@
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from sqlalchemy.exc import IntegrityError
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+INF = '+Inf'
+
+_local = threading.local()
+
+@contextmanager
+def collect():
+    previous = getattr(_local, 'timings', None)
+    _local.timings = timings = {}
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_local, 'timings', None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+def timed(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _bucket_labels():
+    return [f'{le:g}' for le in BUCKETS] + [INF]
+
+def record_timings(timings):
+    from app import db
+    from app.models import StageMetric
+    for name, seconds in timings.items():
+        labels = [f'{le:g}' for le in BUCKETS if seconds <= le] + [INF]
+        updated = StageMetric.query.filter(
+            StageMetric.stage == name, StageMetric.le.in_(labels)
+        ).update({'count': StageMetric.count + 1}, synchronize_session=False)
+        if updated:
+            StageMetric.query.filter_by(stage=name, le=INF).update(
+                {'total': StageMetric.total + seconds}, synchronize_session=False
+            )
+        else:
+            # First sample for this stage; another process may insert the same rows
+            # concurrently, which surfaces as an IntegrityError on commit.
+            for le in _bucket_labels():
+                db.session.add(StageMetric(stage=name, le=le, count=int(le in labels),
+                                           total=seconds if le == INF else 0.0))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            record_timings({name: seconds})
+
+def render_metrics():
+    from app.models import StageMetric, ProcessingJob
+    from app.jobs import JOB_STATES
+    from app.cache import cache_stats
+    from app import db
+
+    lines = [
+        '# HELP soundsep_stage_duration_seconds Time spent in each processing stage.',
+        '# TYPE soundsep_stage_duration_seconds histogram',
+    ]
+    order = {le: i for i, le in enumerate(_bucket_labels())}
+    rows = sorted(StageMetric.query.all(), key=lambda m: (m.stage, order.get(m.le, len(order))))
+    for metric in rows:
+        lines.append(f'soundsep_stage_duration_seconds_bucket{{stage="{metric.stage}",le="{metric.le}"}} {metric.count}')
+        if metric.le == INF:
+            lines.append(f'soundsep_stage_duration_seconds_sum{{stage="{metric.stage}"}} {metric.total:.6f}')
+            lines.append(f'soundsep_stage_duration_seconds_count{{stage="{metric.stage}"}} {metric.count}')
+
+    counts = dict(db.session.query(ProcessingJob.state, db.func.count(ProcessingJob.id))
+                  .group_by(ProcessingJob.state).all())
+    lines += ['# HELP soundsep_jobs Processing jobs by state.', '# TYPE soundsep_jobs gauge']
+    lines += [f'soundsep_jobs{{state="{state}"}} {counts.get(state, 0)}' for state in JOB_STATES]
+    lines += ['# HELP soundsep_queue_depth Jobs waiting for a worker.', '# TYPE soundsep_queue_depth gauge',
+              f'soundsep_queue_depth {counts.get("queued", 0)}']
+
+    stats = cache_stats()
+    lines += ['# HELP soundsep_cache_hits_total Cache hits.', '# TYPE soundsep_cache_hits_total counter']
+    lines += [f'soundsep_cache_hits_total{{cache="{name}"}} {s["hits"]}' for name, s in stats.items()]
+    lines += ['# HELP soundsep_cache_misses_total Cache misses.', '# TYPE soundsep_cache_misses_total counter']
+    lines += [f'soundsep_cache_misses_total{{cache="{name}"}} {s["misses"]}' for name, s in stats.items()]
+    lines += ['# HELP soundsep_cache_hit_ratio Cache hit ratio.', '# TYPE soundsep_cache_hit_ratio gauge']
+    lines += [f'soundsep_cache_hit_ratio{{cache="{name}"}} {s["hit_rate"]:.6f}' for name, s in stats.items()]
+    return '\n'.join(lines) + '\n'
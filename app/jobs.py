@@ -0,0 +1,386 @@
+import os
+import json
+import time
+import select as io_select
+import socket
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func, update, and_, or_
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from app import db
+from app.models import ProcessingJob, AudioFile
+from app import cache
+from app.scheduler import estimate_cost, fair_candidates
+from app.instrumentation import collect, stage, record_timings
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+# Dialects where concurrent claimers can skip rows another transaction has locked.
+SKIP_LOCKED_DIALECTS = ('postgresql',)
+CLAIM_CANDIDATES = 8
+# Channel the processing_job trigger notifies on PostgreSQL, with '<user_id>:<file_id>'.
+JOB_CHANNEL = 'processing_job'
+
+_executor = None
+_worker_app = None
+_uploads_swept_at = None
+
+def _init_worker():
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+    if _worker_app.config['PREWARM_WORKERS']:
+        prewarm_worker(_worker_app)
+
+def prewarm_worker(app):
+    from app.prewarm import prewarm
+    timings = prewarm()
+    app.logger.info(f'Worker {worker_id()} prewarmed in {timings["total"]:.2f} s: ' +
+                    ', '.join(f'{name} {seconds:.2f} s' for name, seconds in timings.items() if name != 'total'))
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=current_app.config['JOB_WORKERS'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker
+        )
+        # Pick up jobs left queued, or stranded by a crash, in a previous server process.
+        reap_expired(current_app.config['JOB_MAX_ATTEMPTS'])
+        pending = ProcessingJob.query.filter(_claimable(datetime.utcnow())).count()
+        for _ in range(min(pending, current_app.config['JOB_WORKERS'])):
+            _executor.submit(drain)
+    return _executor
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def latest_job(audio_file):
+    return ProcessingJob.query.filter_by(audio_file_id=audio_file.id).order_by(ProcessingJob.id.desc()).first()
+
+def enqueue(audio_file):
+    active = ProcessingJob.query.filter(
+        ProcessingJob.audio_file_id == audio_file.id, ProcessingJob.state.in_(('queued', 'running'))
+    ).first()
+    if active:
+        return active
+    entry = cache.lookup_result(cache.memo_key(audio_file))
+    if entry:
+        now = datetime.utcnow()
+        cache.link_result(audio_file, entry)
+        audio_file.processed = True
+        job = ProcessingJob(audio_file_id=audio_file.id, state='done', stage='cached', progress=1.0,
+                            started_at=now, finished_at=now)
+        db.session.add(job)
+        db.session.commit()
+        return job
+    job = ProcessingJob(audio_file_id=audio_file.id, state='queued', stage='queued', progress=0.0,
+                        cost=job_cost(audio_file))
+    db.session.add(job)
+    db.session.commit()
+    if current_app.config['JOB_EXECUTOR'] == 'local':
+        # Pool tasks claim whichever job the scheduler ranks first, not this one.
+        get_executor().submit(drain)
+    return job
+
+def job_cost(audio_file):
+    params = json.loads(audio_file.processing_params or '{}')
+    params = {'n_components': 8, 'max_iterations': 5000, 'sample_rate': 16000, 'solver': 'mu', **params}
+    return estimate_cost(audio_file.duration or 0.0, params, current_app.config['COST_SPEED_FACTOR'])['seconds']
+
+def queue_positions(job_ids=None):
+    # Positions follow the fair-queuing rank that claim_next uses, so a user with one
+    # short job is shown ahead of another user's backlog. The per-user cap is left
+    # out: it delays when a job starts, not where it stands.
+    ranked = fair_candidates(ProcessingJob.state == 'queued', datetime.utcnow()).subquery()
+    positions = select(ranked.c.id, func.row_number().over(
+        order_by=(ranked.c.rank, ranked.c.id)).label('position')).subquery()
+    query = select(positions.c.id, positions.c.position)
+    if job_ids is not None:
+        query = query.where(positions.c.id.in_(job_ids))
+    return dict(db.session.execute(query).all())
+
+def queue_position(job):
+    if job.state != 'queued':
+        return 0
+    return queue_positions([job.id]).get(job.id, 0)
+
+def job_status(job):
+    return {
+        'job_id': job.id,
+        'state': job.state,
+        'stage': job.stage,
+        'progress': round(job.progress or 0.0, 3),
+        'iteration': job.iteration,
+        'queue_position': queue_position(job),
+        'error': job.error,
+        'timings': json.loads(job.timings) if job.timings else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def job_events(user_id, file_ids=None):
+    # Latest job of each requested file, or of every file with an unfinished job.
+    latest = db.session.query(func.max(ProcessingJob.id)).join(AudioFile).filter(AudioFile.user_id == user_id)
+    if file_ids:
+        latest = latest.filter(ProcessingJob.audio_file_id.in_(file_ids))
+    else:
+        latest = latest.filter(ProcessingJob.state.in_(('queued', 'running')))
+    jobs = ProcessingJob.query.filter(ProcessingJob.id.in_(latest.group_by(ProcessingJob.audio_file_id))).all()
+    queued = [job.id for job in jobs if job.state == 'queued']
+    positions = queue_positions(queued) if queued else {}
+    return [{
+        'file_id': job.audio_file_id,
+        'job_id': job.id,
+        'state': job.state,
+        'stage': job.stage,
+        'progress': round(job.progress or 0.0, 3),
+        'iteration': job.iteration,
+        'queue_position': positions.get(job.id, 0),
+        'error': job.error,
+    } for job in jobs]
+
+def _notifications(connection, timeout):
+    # Payloads received within timeout; psycopg2 and psycopg 3 expose LISTEN differently.
+    if hasattr(connection, 'poll'):
+        if not connection.notifies:
+            io_select.select([connection], [], [], timeout)
+            connection.poll()
+        payloads = [n.payload for n in connection.notifies]
+        del connection.notifies[:]
+        return payloads
+    return [n.payload for n in connection.notifies(timeout=timeout, stop_after=1)]
+
+@contextmanager
+def job_notifications(user_id):
+    # Yields wait(timeout), which returns True as soon as one of the user's jobs
+    # changes. Only PostgreSQL can tell us; elsewhere wait just sleeps and callers poll.
+    if db.engine.dialect.name != 'postgresql':
+        yield lambda timeout: time.sleep(timeout) or False
+        return
+    pooled = db.engine.raw_connection()
+    connection = pooled.driver_connection
+    pooled.detach()
+    connection.autocommit = True
+    prefix = f'{user_id}:'
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'LISTEN {JOB_CHANNEL}')
+        cursor.close()
+
+        def wait(timeout):
+            deadline = time.monotonic() + timeout
+            while (left := deadline - time.monotonic()) > 0:
+                if any(payload.startswith(prefix) for payload in _notifications(connection, left)):
+                    return True
+            return False
+        yield wait
+    finally:
+        pooled.close()
+
+def _iteration_reporter(job_id, interval):
+    # Called from solver threads, so it writes through the engine rather than the session.
+    # Progress is best-effort: a failed write is skipped rather than failing the solve.
+    engine = db.engine
+    logger = current_app.logger
+    lock = threading.Lock()
+    last = {'time': 0.0, 'iteration': 0}
+
+    def report(n_iter, fraction):
+        with lock:
+            now = time.monotonic()
+            if now - last['time'] < interval or n_iter <= last['iteration']:
+                return
+            last.update(time=now, iteration=n_iter)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(update(ProcessingJob).where(ProcessingJob.id == job_id)
+                                 .values(stage='nmf', progress=fraction, iteration=n_iter))
+            except SQLAlchemyError as e:
+                logger.warning(f'Job {job_id} progress update skipped: {e}')
+    return report
+
+def _lease_expired(now):
+    return and_(ProcessingJob.state == 'running', ProcessingJob.lease_expires_at < now)
+
+def _claimable(now):
+    # Queued jobs, plus running ones whose worker stopped renewing its lease,
+    # unless another job for the same file is still being processed. The busy files
+    # are read through a derived table rather than a correlated subquery, so the
+    # claim UPDATE can filter on its own target table (MySQL rejects that otherwise).
+    busy = select(ProcessingJob.audio_file_id).where(
+        ProcessingJob.state == 'running', ProcessingJob.lease_expires_at >= now
+    ).subquery()
+    return and_(or_(ProcessingJob.state == 'queued', _lease_expired(now)),
+                ProcessingJob.audio_file_id.not_in(select(busy.c.audio_file_id)))
+
+def _claim(job_id, owner):
+    # The conditional UPDATE is what makes a claim atomic: only one worker's
+    # statement can still match the row once another has taken it.
+    now = datetime.utcnow()
+    claimed = ProcessingJob.query.filter(ProcessingJob.id == job_id, _claimable(now)).update({
+        'state': 'running', 'stage': 'starting', 'started_at': now, 'lease_owner': owner,
+        'lease_expires_at': now + timedelta(seconds=current_app.config['JOB_LEASE_SECONDS']),
+        'heartbeat_at': now, 'attempts': func.coalesce(ProcessingJob.attempts, 0) + 1,
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def claim_next(owner):
+    config = current_app.config
+    reap_expired(config['JOB_MAX_ATTEMPTS'])
+    now = datetime.utcnow()
+    ranked = fair_candidates(_claimable(now), now, config['JOB_MAX_RUNNING_PER_USER'])
+    if db.engine.dialect.name in SKIP_LOCKED_DIALECTS:
+        # Rows locked by other claimers are skipped rather than waited on. The
+        # ranking uses window functions, which cannot be locked, so lock the job rows.
+        ranked = ranked.subquery()
+        query = select(ProcessingJob.id).join(ranked, ranked.c.id == ProcessingJob.id).order_by(
+            ranked.c.rank, ProcessingJob.id).limit(1).with_for_update(skip_locked=True, of=ProcessingJob)
+    else:
+        query = ranked.limit(CLAIM_CANDIDATES)
+    candidates = db.session.execute(query).all()
+    for job_id, *_ in candidates:
+        if _claim(job_id, owner):
+            return job_id
+    db.session.rollback()
+    return None
+
+def reap_expired(max_attempts):
+    # Jobs that keep losing their worker are failed instead of reclaimed forever.
+    now = datetime.utcnow()
+    reaped = ProcessingJob.query.filter(
+        _lease_expired(now), ProcessingJob.attempts >= max_attempts
+    ).update({
+        'state': 'failed', 'error': f'Worker lease expired {max_attempts} times', 'finished_at': now,
+    }, synchronize_session=False)
+    db.session.commit()
+    return reaped
+
+@contextmanager
+def _heartbeat(job_id, owner, lease_seconds, interval):
+    engine = db.engine
+    logger = current_app.logger
+    stopped = threading.Event()
+
+    def beat():
+        # A failed renewal is retried on the next beat; the lease is three beats long,
+        # so a transient lock or dropped connection does not let another worker in.
+        while not stopped.wait(interval):
+            now = datetime.utcnow()
+            try:
+                with engine.begin() as conn:
+                    renewed = conn.execute(
+                        update(ProcessingJob)
+                        .where(ProcessingJob.id == job_id, ProcessingJob.lease_owner == owner)
+                        .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=lease_seconds))
+                    ).rowcount
+            except SQLAlchemyError as e:
+                logger.warning(f'Job {job_id} lease renewal failed, retrying: {e}')
+                continue
+            if not renewed:
+                logger.warning(f'Job {job_id} lease was taken over; {owner} stops renewing it')
+                return
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{job_id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+def drain():
+    app = _worker_app
+    if app is None:
+        from app import create_app
+        app = create_app()
+    with app.app_context():
+        work(worker_id(), burst=True)
+
+def run_claimed(job_id, owner):
+    from app.pipeline import run_pipeline
+    config = current_app.config
+    job = db.session.get(ProcessingJob, job_id)
+    with _heartbeat(job_id, owner, config['JOB_LEASE_SECONDS'], config['JOB_HEARTBEAT_INTERVAL']):
+        def progress(name, fraction):
+            job.stage = name
+            job.progress = fraction
+            db.session.commit()
+
+        with collect() as timings:
+            try:
+                with stage('pipeline'):
+                    outcome = run_pipeline(job.audio_file, progress, _iteration_reporter(
+                        job.id, config['JOB_PROGRESS_INTERVAL']))
+            except Exception as e:
+                db.session.rollback()
+                outcome = {'success': False, 'error': str(e)}
+            holder = db.session.query(ProcessingJob.lease_owner).filter_by(id=job_id).scalar()
+            if holder != owner:
+                db.session.rollback()
+                current_app.logger.warning(f'Job {job_id} was reclaimed by {holder}; dropping its result')
+                return
+            with stage('db_commit'):
+                _finish(job, outcome)
+    job.timings = json.dumps(timings)
+    db.session.commit()
+    record_timings(timings)
+
+def work(owner, burst=False, max_jobs=None):
+    # Worker loop for JOB_EXECUTOR=worker: any number of these can share one database.
+    config = current_app.config
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        try:
+            job_id = claim_next(owner)
+        except OperationalError as e:
+            # SQLite reports lock contention between claimers as an error; try again shortly.
+            db.session.rollback()
+            current_app.logger.warning(f'Claim failed, retrying: {e}')
+            job_id = None
+        if job_id is None:
+            _sweep_uploads(config)
+            if burst:
+                break
+            time.sleep(config['WORKER_POLL_INTERVAL'])
+            continue
+        run_claimed(job_id, owner)
+        db.session.remove()
+        done += 1
+    return done
+
+def _sweep_uploads(config):
+    # Idle workers, including the local pool after each drain, clear abandoned uploads.
+    global _uploads_swept_at
+    from app.uploads import expire_uploads
+    if _uploads_swept_at is not None and time.monotonic() - _uploads_swept_at < config['UPLOAD_EXPIRE_INTERVAL']:
+        return
+    _uploads_swept_at = time.monotonic()
+    try:
+        expired = expire_uploads(config['UPLOAD_SESSION_MAX_AGE'])
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.warning(f'Expiring uploads failed: {e}')
+        return
+    if expired:
+        current_app.logger.info(f'Expired {expired} abandoned uploads')
+
+def _finish(job, outcome):
+    if outcome.get('success'):
+        job.state = 'done'
+        job.stage = 'done'
+        job.progress = 1.0
+        job.audio_file.processed = True
+        cache.remember_result(outcome['analysis'], cache.memo_key(job.audio_file))
+    else:
+        current_app.logger.error(f'Job {job.id} failed: {outcome.get("error")}')
+        job.state = 'failed'
+        job.error = outcome.get('error', 'Unknown error')
+    job.finished_at = datetime.utcnow()
+    job.lease_expires_at = None
+    db.session.commit()
@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import json
 from app import db, login_manager
 
 class User(UserMixin, db.Model):
@@ -34,6 +35,7 @@ class AudioFile(db.Model):
     original_filename= db.Column(db.String(255), nullable=False)
     file_path        = db.Column(db.String(500), nullable=False)
     file_size        = db.Column(db.Integer)
+    content_hash     = db.Column(db.String(64), index=True)
     sample_rate      = db.Column(db.Integer)
     duration         = db.Column(db.Float)
     processed        = db.Column(db.Boolean, default=False)
@@ -42,9 +44,110 @@ class AudioFile(db.Model):
 
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    jobs = db.relationship('ProcessingJob', backref='audio_file', lazy=True,
+                           cascade='all, delete-orphan', order_by='ProcessingJob.id')
+    analysis = db.relationship('AnalysisResult', backref='audio_file', uselist=False,
+                               cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_audio_file_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_audio_file_user_id_processed', 'user_id', 'processed'),
+    )
+
     def __repr__(self):
         return f'<AudioFile {self.filename}>'
 
+class ProcessingJob(db.Model):
+    id            = db.Column(db.Integer, primary_key=True)
+    state         = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    stage         = db.Column(db.String(50))
+    progress      = db.Column(db.Float, default=0.0)
+    iteration     = db.Column(db.Integer)   # latest NMF iteration reported
+    error         = db.Column(db.Text)
+    timings       = db.Column(db.Text)   # JSON string, seconds per stage
+    created_at    = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at    = db.Column(db.DateTime)
+    finished_at   = db.Column(db.DateTime)
+    lease_owner   = db.Column(db.String(120))   # host:pid of the worker holding the job
+    lease_expires_at = db.Column(db.DateTime)
+    heartbeat_at  = db.Column(db.DateTime)
+    attempts      = db.Column(db.Integer, default=0)
+    cost          = db.Column(db.Float)   # estimated CPU seconds, upper bound
+
+    audio_file_id = db.Column(db.Integer, db.ForeignKey('audio_file.id'), nullable=False)
+
+    def __repr__(self):
+        return f'<ProcessingJob {self.id} {self.state}>'
+
+class AnalysisResult(db.Model):
+    id               = db.Column(db.Integer, primary_key=True)
+    result_dir       = db.Column(db.String(500), nullable=False)
+    arrays_path      = db.Column(db.String(500), nullable=False)
+    sr               = db.Column(db.Integer)
+    metrics          = db.Column(db.Text)   # JSON string
+    spectrogram_path = db.Column(db.String(255))
+    nmf_path         = db.Column(db.String(255))
+    cluster_path     = db.Column(db.String(255))
+    summary_path     = db.Column(db.String(255))
+    cache_key        = db.Column(db.String(64), index=True)
+    hit_count        = db.Column(db.Integer, default=0)
+    last_used_at     = db.Column(db.DateTime)
+    created_at       = db.Column(db.DateTime, default=datetime.utcnow)
+
+    audio_file_id = db.Column(db.Integer, db.ForeignKey('audio_file.id'), nullable=False, unique=True)
+
+    @property
+    def version(self):
+        return int(self.created_at.timestamp()) if self.created_at else 0
+
+    def to_results_data(self):
+        return {
+            'processing_result': {
+                'sr': self.sr,
+                'results': json.loads(self.metrics) if self.metrics else None
+            },
+            'spectrogram_path': self.spectrogram_path,
+            'nmf_path': self.nmf_path,
+            'cluster_path': self.cluster_path,
+            'summary_path': self.summary_path,
+        }
+
+    def __repr__(self):
+        return f'<AnalysisResult {self.audio_file_id}>'
+
+class UploadSession(db.Model):
+    id               = db.Column(db.String(32), primary_key=True)   # uuid4 hex
+    original_filename= db.Column(db.String(255), nullable=False)
+    filename         = db.Column(db.String(255), nullable=False)
+    file_path        = db.Column(db.String(500), nullable=False)
+    total_size       = db.Column(db.BigInteger, nullable=False)
+    received         = db.Column(db.BigInteger, nullable=False, default=0)
+    processing_params= db.Column(db.Text)   # JSON string
+    created_at       = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at       = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received}/{self.total_size}>'
+
+class StageMetric(db.Model):
+    stage = db.Column(db.String(50), primary_key=True)
+    le    = db.Column(db.String(10), primary_key=True)   # histogram bucket upper bound
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<StageMetric {self.stage} le={self.le}>'
+
+class CacheStat(db.Model):
+    name   = db.Column(db.String(50), primary_key=True)
+    hits   = db.Column(db.Integer, nullable=False, default=0)
+    misses = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheStat {self.name} {self.hits}/{self.misses}>'
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -0,0 +1,99 @@
+import os
+import json
+from flask import current_app
+from app.processor import process_audio, load_audio
+from app.result_store import save_result
+from app.cache import disk_cache
+from app.plots import PLOTS, clear_plots, build_variants
+from app.tiles import build_pyramid
+from app.reconstruction import build_stems
+from app.instrumentation import stage
+from app.solvers import DICTIONARY_SOLVERS
+from app.dictionary import load_dictionary
+
+def results_dir(file_id):
+    return os.path.join(current_app.root_path, 'static', 'results', str(file_id))
+
+def render_all(file_id, output_dir, processing_result, progress):
+    from app.visualizer import render_plots
+    plot_args = {
+        'spectrogram': (processing_result['D'], processing_result['sr']),
+        'nmf_components': (processing_result['W'], processing_result['H'],
+                           processing_result['results']['component_classes']),
+        'cluster_plot': (processing_result['labels'],),
+        'summary_plot': (processing_result['results'],),
+    }
+    progress('render', 0.75)
+    tasks = [(kind, plot_args[kind], os.path.join(output_dir, f'{kind}.png')) for _, kind in PLOTS]
+    rendered = render_plots(tasks, max_workers=current_app.config['PLOT_WORKERS'])
+    plot_paths = {}
+    for (key, kind), outcome in zip(PLOTS, rendered):
+        if outcome.get('success'):
+            plot_paths[key] = f"/static/results/{file_id}/{kind}.png"
+        else:
+            current_app.logger.warning(f'Plot {kind} not created: {outcome.get("error")}')
+            plot_paths[key] = None
+    return plot_paths
+
+def run_pipeline(audio_file, progress=None, on_iteration=None):
+    progress = progress or (lambda stage, fraction: None)
+    params = json.loads(audio_file.processing_params)
+    dictionary = None
+    if params.get('solver') in DICTIONARY_SOLVERS:
+        try:
+            dictionary = load_dictionary(current_app.config['DICTIONARY_FOLDER'], params['sample_rate'],
+                                         params.get('dictionary_version'))
+        except FileNotFoundError as e:
+            return {'success': False, 'error': str(e)}
+    processing_result = process_audio(
+        audio_file.file_path,
+        n_components=params['n_components'],
+        max_iter=params['max_iterations'],
+        sr=params['sample_rate'],
+        solver=params.get('solver', 'mu'),
+        tol=current_app.config['NMF_TOL'],
+        check_every=current_app.config['NMF_CHECK_EVERY'],
+        seed=params.get('seed'),
+        n_restarts=params.get('n_restarts', 1),
+        dictionary=dictionary,
+        n_free=current_app.config['DICTIONARY_FREE_COMPONENTS'],
+        blas_threads=current_app.config['NMF_BLAS_THREADS'],
+        progress=progress,
+        on_iteration=on_iteration,
+        audio_cache=disk_cache('audio'),
+        feature_cache=disk_cache('features'),
+        content_hash=audio_file.content_hash
+    )
+    if not processing_result.get('success', False):
+        return processing_result
+
+    output_dir = results_dir(audio_file.id)
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+    except Exception as e:
+        return {'success': False, 'error': f"Can't create output directory for results: {e}"}
+
+    progress('reconstruct', 0.8)
+    with stage('reconstruct'):
+        y, _ = load_audio(audio_file.file_path, params['sample_rate'], disk_cache('audio'), audio_file.content_hash)
+        build_stems(y, processing_result['W'], processing_result['H'],
+                    processing_result['results']['component_classes'], output_dir, processing_result['sr'])
+        del y
+
+    clear_plots(output_dir)
+    plot_paths = {}
+    if current_app.config['PLOTS_EAGER']:
+        with stage('render'):
+            plot_paths = render_all(audio_file.id, output_dir, processing_result, progress)
+        with stage('variants'):
+            build_variants(output_dir, [kind for key, kind in PLOTS if plot_paths.get(key)])
+
+    progress('tiles', 0.9)
+    with stage('tiles'):
+        build_pyramid(processing_result['D'], os.path.join(output_dir, 'tiles'), processing_result['sr'],
+                      mode=current_app.config['TILE_POOLING'])
+
+    progress('saving', 0.95)
+    with stage('save_result'):
+        analysis = save_result(audio_file, output_dir, processing_result, plot_paths)
+    return {'success': True, 'analysis': analysis}
@@ -0,0 +1,97 @@
+import os
+import glob
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.result_store import load_arrays
+
+PLOTS = (
+    ('spectrogram_path', 'spectrogram'),
+    ('nmf_path', 'nmf_components'),
+    ('cluster_path', 'cluster_plot'),
+    ('summary_path', 'summary_plot'),
+)
+PLOT_KINDS = tuple(kind for _, kind in PLOTS)
+
+# Downscaled copies served through srcset; the full PNG is only fetched by the viewer.
+VARIANT_WIDTHS = (480, 800, 1200)
+VARIANT_FORMATS = {'webp': 'image/webp', 'png': 'image/png'}
+WEBP_QUALITY = 80
+
+PLOT_INPUTS = {
+    'spectrogram': ('D',),
+    'nmf_components': ('W', 'H'),
+    'cluster_plot': ('labels',),
+    'summary_plot': (),
+}
+
+def plot_path(analysis, kind):
+    return os.path.join(analysis.result_dir, f'{kind}.png')
+
+def variant_path(result_dir, kind, width, fmt):
+    return os.path.join(result_dir, f'{kind}.w{width}.{fmt}')
+
+def make_variant(source, out_path, width, fmt):
+    from PIL import Image
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        tmp_path = f'{out_path}.{uuid.uuid4().hex}.tmp'
+        if fmt == 'webp':
+            image.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+        else:
+            # Plots use few distinct colours, so a 256-colour palette is nearly lossless.
+            image.quantize(256, method=Image.Quantize.FASTOCTREE).save(tmp_path, 'PNG', optimize=True)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def build_variants(result_dir, kinds):
+    # Pillow releases the GIL while resizing and encoding, so variants build on threads.
+    tasks = [(os.path.join(result_dir, f'{kind}.png'), variant_path(result_dir, kind, width, fmt), width, fmt)
+             for kind in kinds for width in VARIANT_WIDTHS for fmt in VARIANT_FORMATS]
+    with ThreadPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1) or 1) as pool:
+        return list(pool.map(lambda task: make_variant(*task), tasks))
+
+def ensure_variant(analysis, kind, width, fmt):
+    path = variant_path(analysis.result_dir, kind, width, fmt)
+    if os.path.exists(path):
+        return {'success': True, 'path': path}
+    outcome = ensure_plot(analysis, kind)
+    if not outcome.get('success'):
+        return outcome
+    try:
+        make_variant(outcome['path'], path, width, fmt)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    return {'success': True, 'path': path}
+
+def plot_args(kind, arrays, sr, metrics):
+    if kind == 'spectrogram':
+        return (arrays['D'], sr)
+    if kind == 'nmf_components':
+        return (arrays['W'], arrays['H'], metrics.get('component_classes'))
+    if kind == 'cluster_plot':
+        return (arrays['labels'],)
+    return (metrics,)
+
+def ensure_plot(analysis, kind):
+    path = plot_path(analysis, kind)
+    if os.path.exists(path):
+        return {'success': True, 'path': path}
+    from app.visualizer import RENDERERS
+    arrays = load_arrays(analysis, PLOT_INPUTS[kind])
+    # Unique per call: request threads in one process may render the same plot at once.
+    tmp_path = f'{path[:-4]}.{uuid.uuid4().hex}.tmp.png'
+    outcome = RENDERERS[kind](*plot_args(kind, arrays, analysis.sr, arrays['metrics']), out_path=tmp_path)
+    if not outcome.get('success'):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return outcome
+    os.replace(tmp_path, path)
+    return {'success': True, 'path': path}
+
+def clear_plots(output_dir):
+    for kind in PLOT_KINDS:
+        for path in [os.path.join(output_dir, f'{kind}.png')] + glob.glob(os.path.join(output_dir, f'{kind}.w*.*')):
+            if os.path.exists(path):
+                os.remove(path)
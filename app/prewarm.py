@@ -0,0 +1,48 @@
+import os
+import time
+import tempfile
+import numpy as np
+
+def configure_numba_cache(path):
+    # librosa's numba kernels are compiled with cache=True; point the cache at a
+    # writable directory so it survives restarts even when site-packages is read-only.
+    # Has to happen before numba is first imported.
+    if path and 'NUMBA_CACHE_DIR' not in os.environ:
+        os.makedirs(path, exist_ok=True)
+        os.environ['NUMBA_CACHE_DIR'] = os.path.abspath(path)
+
+def prewarm(sr=16000):
+    # Runs each stage of the processing path once on a second of noise, so imports,
+    # numba kernels, resampler tables and BLAS start-up are paid before the first job.
+    from app.processor import load_audio, compute_features, cluster_activations
+    from app.solvers import run_nmf
+    timings = {}
+
+    def timed(name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+        return value
+
+    def imports():
+        import librosa.core
+        import soundfile
+        import audioread
+        import scipy.signal
+        import sklearn.cluster
+
+    timed('imports', imports)
+    y = np.random.default_rng(0).standard_normal(sr * 2).astype(np.float32) * 0.1
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        import soundfile as sf
+        sf.write(path, y, sr * 2)
+        y, _ = timed('decode', load_audio, path, sr)
+    finally:
+        os.remove(path)
+    magnitude, _ = timed('stft', compute_features, y)
+    fit = timed('nmf', run_nmf, magnitude + 1e-10, 2, 20, solver='mu32', tol=0, seed=0)
+    timed('clustering', cluster_activations, fit['H'])
+    timings['total'] = sum(timings.values())
+    return timings
@@ -1,30 +1,65 @@
+import os
 import numpy as np
-import librosa
-from sklearn.cluster import KMeans
+from app.solvers import run_nmf
+from app.dictionary import component_classes
+from app.instrumentation import stage
 
-def process_audio(file_path, n_components=8, max_iter=5000, sr=16000):
+N_FFT = 1024
+HOP_LENGTH = 512
+WINDOW = 'hann'
+
+def process_audio(file_path, n_components=8, max_iter=5000, sr=16000,
+                  solver='mu', tol=1e-4, check_every=10, seed=None, blas_threads=None, n_restarts=1,
+                  dictionary=None, n_free=2, on_iteration=None,
+                  progress=None, audio_cache=None, feature_cache=None, content_hash=None):
+    progress = progress or (lambda stage, fraction: None)
     try:
-        y, sr_loaded = librosa.load(file_path, sr=sr)
-        stft = librosa.stft(y, n_fft=1024, hop_length=512)
-        magnitude, _ = librosa.magphase(stft)
-        D = librosa.amplitude_to_db(magnitude, ref=np.max)
+        if dictionary is not None and dictionary.sr != sr:
+            raise ValueError(f'Component dictionary v{dictionary.version} was built for {dictionary.sr} Hz')
+        magnitude, D, sr_loaded, n_samples = load_features(
+            file_path, sr, audio_cache, feature_cache, content_hash, progress=progress
+        )
         mag = magnitude + 1e-10
-        rows, cols = mag.shape
-
-        W = np.abs(np.random.normal(0, 2.5, size=(rows, n_components)))
-        H = np.abs(np.random.normal(0, 2.5, size=(n_components, cols)))
 
-        for _ in range(max_iter):
-            H *= (W.T @ (mag / (W @ H + 1e-10))) / (W.T @ np.ones((rows, cols)) + 1e-10)
-            W *= ((mag / (W @ H + 1e-10)) @ H.T) / (np.ones((rows, cols)) @ H.T + 1e-10)
+        progress('nmf', 0.15)
+        with stage('nmf'):
+            fit = run_nmf(mag, n_components, max_iter, solver=solver, tol=tol,
+                          check_every=check_every, seed=seed, blas_threads=blas_threads,
+                          n_restarts=n_restarts,
+                          dictionary=dictionary.W if dictionary is not None else None, n_free=n_free,
+                          callback=on_iteration and (
+                              lambda n_iter: on_iteration(n_iter, 0.15 + 0.55 * min(1.0, n_iter / max_iter))
+                          ))
+        W, H = fit['W'], fit['H']
+        n_fixed = fit.get('n_fixed', 0)
+        classes = component_classes(W, sr_loaded)
+        if n_fixed:
+            classes[:n_fixed] = dictionary.classes
 
-        labels = KMeans(n_clusters=2, random_state=0, n_init=10).fit_predict(H.T)
+        progress('clustering', 0.7)
+        with stage('clustering'):
+            labels = orient_labels(H, cluster_activations(H), classes)
 
         results = {
             'sr': sr_loaded,
-            'duration': len(y)/sr_loaded,
-            'n_components': n_components,
+            'duration': n_samples/sr_loaded,
+            'n_components': W.shape[1],
             'max_iter': max_iter,
+            'solver': solver,
+            'n_iter': fit['n_iter'],
+            'final_loss': fit['loss'],
+            'loss_name': fit['loss_name'],
+            'nmf_time': fit['wall_time'],
+            'time_per_iter': fit['time_per_iter'],
+            'peak_rss_mb': fit['peak_rss_mb'],
+            'peak_rss_scope': fit['peak_rss_scope'],
+            'rss_delta_mb': fit['rss_delta_mb'],
+            'n_restarts': fit['n_restarts'],
+            'best_restart': fit['best_restart'],
+            'restart_losses': fit['restart_losses'],
+            'n_fixed': n_fixed,
+            'dictionary_version': dictionary.version if dictionary is not None else None,
+            'component_classes': classes.tolist(),
             'W_shape': W.shape,
             'H_shape': H.shape,
             'D_shape': D.shape,
@@ -48,16 +83,99 @@ def process_audio(file_path, n_components=8, max_iter=5000, sr=16000):
             'error': str(e)
         }
 
+def cluster_activations(H):
+    from sklearn.cluster import KMeans
+    return KMeans(n_clusters=2, random_state=0, n_init=10).fit_predict(H.T)
+
+def orient_labels(H, labels, classes):
+    # Make cluster 0 the frames dominated by heart components, cluster 1 the lung ones.
+    heart = classes == 'heart'
+    if heart.all() or not heart.any() or len(np.unique(labels)) < 2:
+        return labels
+    share = H[heart].sum(axis=0) / (H.sum(axis=0) + 1e-10)
+    if share[labels == 0].mean() < share[labels == 1].mean():
+        return 1 - labels
+    return labels
+
+def _file_token(file_path):
+    stat = os.stat(file_path)
+    return f'{os.path.basename(file_path)}-{stat.st_size}-{int(stat.st_mtime)}'
+
+def load_audio(file_path, sr, audio_cache=None, content_hash=None):
+    import librosa
+    if audio_cache is None:
+        return librosa.load(file_path, sr=sr)
+    key = f"{content_hash or _file_token(file_path)}_{sr or 'native'}"
+    cached = audio_cache.get_arrays(key, ['y'])
+    if cached:
+        return cached['y'], sr
+    y, sr_loaded = librosa.load(file_path, sr=sr)
+    audio_cache.put_arrays(key, {'y': y.astype(np.float32, copy=False)})
+    return y, sr_loaded
+
+def compute_features(y, n_fft=N_FFT, hop_length=HOP_LENGTH, window=WINDOW):
+    import librosa
+    stft = librosa.stft(y, n_fft=n_fft, hop_length=hop_length, window=window)
+    magnitude, _ = librosa.magphase(stft)
+    D = librosa.amplitude_to_db(magnitude, ref=np.max)
+    return magnitude.astype(np.float32, copy=False), D.astype(np.float32, copy=False)
+
+def load_features(file_path, sr, audio_cache=None, feature_cache=None, content_hash=None,
+                  n_fft=N_FFT, hop_length=HOP_LENGTH, window=WINDOW, progress=None):
+    progress = progress or (lambda stage, fraction: None)
+    key = f"{content_hash or _file_token(file_path)}_{sr or 'native'}_{n_fft}_{hop_length}_{window}"
+    if feature_cache is not None:
+        with stage('feature_cache'):
+            cached = feature_cache.get_arrays(key, ['mag', 'db', 'meta'])
+        if cached:
+            n_samples, sr_loaded = (int(v) for v in cached['meta'])
+            return cached['mag'], cached['db'], sr_loaded, n_samples
+    progress('decode', 0.0)
+    with stage('decode'):
+        y, sr_loaded = load_audio(file_path, sr, audio_cache, content_hash)
+    progress('stft', 0.1)
+    with stage('stft'):
+        magnitude, D = compute_features(y, n_fft, hop_length, window)
+    if feature_cache is not None:
+        with stage('feature_cache'):
+            feature_cache.put_arrays(key, {
+                'mag': magnitude, 'db': D, 'meta': np.array([len(y), sr_loaded], dtype=np.int64)
+            })
+    return magnitude, D, sr_loaded, len(y)
+
+def probe_audio(file_path):
+    import soundfile as sf
+    import audioread
+    try:
+        info = sf.info(file_path)
+        if info.frames > 0:
+            return info.samplerate, info.frames, info.channels, 'soundfile'
+    except Exception:
+        pass
+    try:
+        with audioread.audio_open(file_path) as f:
+            if f.duration:
+                return f.samplerate, int(round(f.duration * f.samplerate)), f.channels, 'audioread'
+    except Exception:
+        pass
+    return None
+
 def get_audio_info(file_path):
     try:
-        y, sr = librosa.load(file_path, sr=None)
-        duration = len(y) / sr
+        probed = probe_audio(file_path)
+        if probed:
+            sr, samples, channels, method = probed
+        else:
+            import librosa
+            y, sr = librosa.load(file_path, sr=None)
+            samples, channels, method = len(y), 1, 'decode'  # librosa loads mono by default
         return {
             'success': True,
             'sample_rate': sr,
-            'duration': duration,
-            'samples': len(y),
-            'channels': 1  # librosa loads mono by default
+            'duration': samples / sr,
+            'samples': samples,
+            'channels': channels,
+            'probe': method
         }
     except Exception as e:
         return {
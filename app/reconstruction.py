@@ -0,0 +1,95 @@
+import os
+import uuid
+import numpy as np
+from app.processor import N_FFT, HOP_LENGTH, WINDOW
+from app.dictionary import component_classes
+
+STEMS = ('heart', 'lung')
+CHUNK_FRAMES = 2048
+EPS = 1e-10
+
+def stems_dir(result_dir):
+    return os.path.join(result_dir, 'stems')
+
+def stem_path(result_dir, name):
+    return os.path.join(stems_dir(result_dir), f'{name}.wav')
+
+def _frames(y, start, stop, n_fft, hop_length):
+    # Samples behind frames [start, stop) of a centred, zero-padded STFT.
+    pad = n_fft // 2
+    lo, hi = start * hop_length - pad, (stop - 1) * hop_length + n_fft - pad
+    segment = np.zeros(hi - lo, dtype=np.float32)
+    segment[max(0, -lo):max(0, -lo) + len(y[max(0, lo):hi])] = y[max(0, lo):hi]
+    return segment
+
+def _overlap_add(frames, hop_length, blocks):
+    # frames is (n_fft, n); block i + j receives the j-th hop of frame i.
+    for j in range(blocks.shape[0] - frames.shape[1] + 1):
+        blocks[j:j + frames.shape[1]] += frames[j * hop_length:(j + 1) * hop_length].T
+
+def build_stems(y, W, H, classes, result_dir, sr, n_fft=N_FFT, hop_length=HOP_LENGTH, window=WINDOW,
+                chunk_frames=CHUNK_FRAMES):
+    import librosa
+    import soundfile as sf
+    from scipy.signal import get_window
+    if n_fft % hop_length:
+        raise ValueError('Stem reconstruction needs n_fft to be a multiple of hop_length')
+    overlap = n_fft // hop_length - 1
+    pad, n_frames = n_fft // 2, H.shape[1]
+    win = get_window(window, n_fft, fftbins=True).astype(np.float32)
+    groups = {name: np.flatnonzero(np.asarray(classes) == name) for name in STEMS}
+
+    os.makedirs(stems_dir(result_dir), exist_ok=True)
+    # Unique per call: request threads in one process may rebuild the same stems at once.
+    token = uuid.uuid4().hex
+    tmp_paths = {name: f'{stem_path(result_dir, name)}.{token}.tmp' for name in STEMS}
+    writers = {name: sf.SoundFile(tmp_paths[name], 'w', samplerate=sr, channels=1,
+                                  subtype='PCM_16', format='WAV') for name in STEMS}
+    carry = {name: np.zeros((overlap, hop_length), dtype=np.float32) for name in STEMS}
+    norm_carry = np.zeros((overlap, hop_length), dtype=np.float32)
+    try:
+        for start in range(0, n_frames, chunk_frames):
+            stop = min(start + chunk_frames, n_frames)
+            count = stop - start
+            S = librosa.stft(_frames(y, start, stop, n_fft, hop_length), n_fft=n_fft,
+                             hop_length=hop_length, window=window, center=False)
+
+            # Wiener-style soft masks from each group's share of the modelled power.
+            power = {name: np.square(W[:, idx] @ H[idx, start:stop]) for name, idx in groups.items()}
+            total = sum(power.values()) + EPS
+
+            norm = np.zeros((count + overlap, hop_length), dtype=np.float32)
+            norm[:overlap] = norm_carry
+            _overlap_add(np.repeat(np.square(win)[:, None], count, axis=1), hop_length, norm)
+            # Blocks past this chunk still get overlap from the next one, except at the end.
+            final = count if stop < n_frames else count + overlap
+            lo, hi = max(pad - start * hop_length, 0), len(y) + pad - start * hop_length
+            for name in STEMS:
+                blocks = np.zeros((count + overlap, hop_length), dtype=np.float32)
+                blocks[:overlap] = carry[name]
+                frames = np.fft.irfft(S * (power[name] / total), n=n_fft, axis=0) * win[:, None]
+                _overlap_add(frames, hop_length, blocks)
+                carry[name] = blocks[count:].copy()
+                out = (blocks[:final] / np.maximum(norm[:final], EPS)).ravel()
+                writers[name].write(np.clip(out[lo:max(hi, 0)], -1.0, 1.0))
+            norm_carry = norm[count:].copy()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for name in STEMS:
+        os.replace(tmp_paths[name], stem_path(result_dir, name))
+    return {'success': True, 'paths': {name: stem_path(result_dir, name) for name in STEMS}}
+
+def ensure_stems(analysis, audio_file, audio_cache=None):
+    paths = {name: stem_path(analysis.result_dir, name) for name in STEMS}
+    if all(os.path.exists(path) for path in paths.values()):
+        return {'success': True, 'paths': paths}
+    from app.processor import load_audio
+    from app.result_store import load_arrays
+    try:
+        arrays = load_arrays(analysis, ('W', 'H'))
+        classes = arrays['metrics'].get('component_classes') or component_classes(arrays['W'], analysis.sr)
+        y, _ = load_audio(audio_file.file_path, analysis.sr, audio_cache, audio_file.content_hash)
+        return build_stems(y, arrays['W'], arrays['H'], classes, analysis.result_dir, analysis.sr)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
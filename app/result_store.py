@@ -0,0 +1,73 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from flask import current_app
+from app import db
+from app.models import AnalysisResult
+from app.artifacts import write_artifact, open_artifact
+
+ARTIFACT_DIRNAME = 'artifact'
+LEGACY_FILENAME = 'analysis.npz'
+# Frame axis of each stored array; readers can pull a time window of these.
+TIME_AXES = {'H': 1, 'D': 1, 'labels': 0}
+
+def _to_builtin(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def save_result(audio_file, output_dir, processing_result, plot_paths):
+    metrics = json.dumps(processing_result['results'], default=_to_builtin)
+    arrays_path = os.path.join(output_dir, ARTIFACT_DIRNAME)
+    config = current_app.config
+    write_artifact(
+        arrays_path,
+        {name: processing_result[name] for name in ('W', 'H', 'labels', 'D')},
+        json.loads(metrics),
+        TIME_AXES,
+        encodings={'D': config['ARTIFACT_D_ENCODING']},
+        compress=config['ARTIFACT_COMPRESS'],
+        chunk_frames=config['ARTIFACT_CHUNK_FRAMES']
+    )
+    legacy_path = os.path.join(output_dir, LEGACY_FILENAME)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    analysis = audio_file.analysis or AnalysisResult(audio_file_id=audio_file.id)
+    analysis.result_dir = output_dir
+    analysis.arrays_path = arrays_path
+    analysis.sr = int(processing_result['sr'])
+    analysis.metrics = metrics
+    analysis.spectrogram_path = plot_paths.get('spectrogram_path')
+    analysis.nmf_path = plot_paths.get('nmf_path')
+    analysis.cluster_path = plot_paths.get('cluster_path')
+    analysis.summary_path = plot_paths.get('summary_path')
+    analysis.created_at = datetime.utcnow()
+    db.session.add(analysis)
+    return analysis
+
+def _window(name, array, start, stop):
+    if name not in TIME_AXES or (start is None and stop is None):
+        return array
+    index = [slice(None)] * array.ndim
+    index[TIME_AXES[name]] = slice(start, stop)
+    return array[tuple(index)]
+
+def load_arrays(analysis, names=('W', 'H', 'labels'), start=None, stop=None):
+    # start/stop select a frame window of the time-indexed arrays. Artifact reads
+    # come back as read-only memory-mapped views where the storage allows it.
+    if analysis.arrays_path.endswith('.npz'):
+        with np.load(analysis.arrays_path) as data:
+            arrays = {name: _window(name, data[name], start, stop) for name in names}
+            arrays['metrics'] = json.loads(str(data['metrics']))
+        return arrays
+    artifact = open_artifact(analysis.arrays_path)
+    arrays = {name: artifact.read(name, start, stop) for name in names}
+    arrays['metrics'] = artifact.metrics
+    return arrays
+
+def open_array(analysis, name):
+    # Lazy handle for callers that walk an array in slices, such as the tile builder.
+    if analysis.arrays_path.endswith('.npz'):
+        return load_arrays(analysis, (name,))[name]
+    return open_artifact(analysis.arrays_path).array(name)
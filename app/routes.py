@@ -1,24 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, send_file, abort, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from app import db
-from app.models import User, AudioFile
-from app.forms import RegistrationForm, LoginForm, UploadForm, ProfileForm
-from app.processor import process_audio, get_audio_info
-from app.visualizer import (
-    create_spectrogram_plot,
-    create_nmf_components_plot,
-    create_cluster_plot,
-    create_summary_plot,
+from app.models import User, AudioFile, UploadSession
+from app.forms import RegistrationForm, LoginForm, UploadForm, ChunkedUploadForm, EstimateForm, ProfileForm
+from app.processor import get_audio_info
+from app import jobs
+from app.cache import release_result
+from app.plots import PLOTS, PLOT_KINDS, VARIANT_WIDTHS, VARIANT_FORMATS, ensure_plot, ensure_variant
+from app import tiles
+from app.reconstruction import STEMS, ensure_stems
+from app.cache import disk_cache
+from app.instrumentation import collect, stage, record_timings, render_metrics
+from app.uploads import (
+    save_and_hash, looks_like_audio, write_chunk, finish_digest, discard_partial, is_uploaded, HEADER_BYTES
 )
+from app.solvers import DICTIONARY_SOLVERS
+from app.dictionary import latest_version, load_dictionary
+from app.scheduler import admit, format_seconds
+from app.export import EXPORT_ARRAYS, COMPRESSIONS, frame_window, stream_npz, zstd_compressor
+from app.result_store import open_array
 import os
+import shutil
 import uuid
 import json
-import base64
+import time
 from datetime import datetime
+from sqlalchemy import func, case, and_, or_
 
 bp = Blueprint('main', __name__)
 
+FILES_PER_PAGE = 10
+
 @bp.route('/')
 def index():
     return render_template('index.html')
@@ -90,8 +103,10 @@ def logout():
 @login_required
 def dashboard():
     recent_files = AudioFile.query.filter_by(user_id=current_user.id).order_by(AudioFile.created_at.desc()).limit(5).all()
-    total_files = AudioFile.query.filter_by(user_id=current_user.id).count()
-    processed_files = AudioFile.query.filter_by(user_id=current_user.id, processed=True).count()
+    total_files, processed_files = db.session.query(
+        func.count(AudioFile.id),
+        func.coalesce(func.sum(case((AudioFile.processed, 1), else_=0)), 0)
+    ).filter(AudioFile.user_id == current_user.id).one()
     stats = {
         'total_files': total_files,
         'processed_files': processed_files,
@@ -106,36 +121,23 @@ def upload():
     form = UploadForm()
     if form.validate_on_submit():
         file = form.audio_file.data
+        try:
+            params = _processing_params(form)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return render_template('upload.html', form=form)
         if file:
             filename = secure_filename(file.filename)
             unique_filename = f"{uuid.uuid4()}_{filename}"
             file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
             try:
-                file.save(file_path)
-                audio_info = get_audio_info(file_path)
-                if not audio_info.get('success', False):
-                    flash(f'Error reading audio file: {audio_info.get("error", "Unknown")}', 'error')
-                    os.remove(file_path)
-                    return render_template('upload.html', form=form)
-                audio_file = AudioFile(
-                    filename=unique_filename,
-                    original_filename=filename,
-                    file_path=file_path,
-                    file_size=os.path.getsize(file_path),
-                    sample_rate=audio_info['sample_rate'],
-                    duration=audio_info['duration'],
-                    user_id=current_user.id,
-                    processing_params=json.dumps({
-                        'n_components': form.n_components.data,
-                        'max_iterations': form.max_iterations.data,
-                        'sample_rate': form.sample_rate.data,
-                        'description': form.description.data
-                    })
-                )
-                db.session.add(audio_file)
-                db.session.commit()
+                content_hash, file_size = save_and_hash(file, file_path)
+                audio_file = _register_upload(file_path, unique_filename, filename, file_size, content_hash, params)
                 flash('File uploaded successfully! Processing...', 'success')
                 return redirect(url_for('main.process', file_id=audio_file.id))
+            except ValueError as e:
+                os.remove(file_path)
+                flash(str(e), 'error')
             except Exception as e:
                 if os.path.exists(file_path):
                     os.remove(file_path)
@@ -143,81 +145,180 @@ def upload():
                 current_app.logger.error(f'Upload error: {e}')
     return render_template('upload.html', form=form)
 
-@bp.route('/process/<int:file_id>')
-@login_required
-def process(file_id):
-    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
-    if audio_file.processed:
-        return redirect(url_for('main.results', file_id=file_id))
-    params = json.loads(audio_file.processing_params)
-    processing_result = process_audio(
-        audio_file.file_path,
-        n_components=params['n_components'],
-        max_iter=params['max_iterations'],
-        sr=params['sample_rate']
+def _processing_params(form):
+    dictionary_version = None
+    n_components = form.n_components.data
+    if form.solver.data in DICTIONARY_SOLVERS:
+        dictionary_version = latest_version(current_app.config['DICTIONARY_FOLDER'], form.sample_rate.data)
+        if dictionary_version is None:
+            raise ValueError('No heart/lung dictionary has been built for this sample rate yet.')
+        # The dictionary fixes the model size: its templates plus the free components.
+        dictionary = load_dictionary(current_app.config['DICTIONARY_FOLDER'], form.sample_rate.data, dictionary_version)
+        n_components = dictionary.W.shape[1] + current_app.config['DICTIONARY_FREE_COMPONENTS']
+    return {
+        'n_components': n_components,
+        'max_iterations': form.max_iterations.data,
+        'sample_rate': form.sample_rate.data,
+        'solver': form.solver.data,
+        'seed': current_app.config['NMF_SEED'],
+        'n_restarts': form.n_restarts.data,
+        'dictionary_version': dictionary_version,
+        'description': form.description.data
+    }
+
+def _register_upload(file_path, unique_filename, filename, file_size, content_hash, params):
+    audio_info = get_audio_info(file_path)
+    if not audio_info.get('success', False):
+        raise ValueError(f'Error reading audio file: {audio_info.get("error", "Unknown")}')
+    params, _, changes = admit(current_user.id, audio_info['duration'], params, current_app.config)
+    if changes:
+        flash(f'Settings reduced to fit the processing budget: {", ".join(changes)}.', 'info')
+    audio_file = AudioFile(
+        filename=unique_filename,
+        original_filename=filename,
+        file_path=file_path,
+        file_size=file_size,
+        content_hash=content_hash,
+        sample_rate=audio_info['sample_rate'],
+        duration=audio_info['duration'],
+        user_id=current_user.id,
+        processing_params=json.dumps(params)
     )
-    if not processing_result.get('success', False):
-        print('Processing failed, error:', processing_result.get('error'))
-        flash(f'Processing failed: {processing_result.get("error", "Unknown error")}', 'error')
-        return redirect(url_for('main.dashboard'))
+    db.session.add(audio_file)
+    db.session.commit()
+    jobs.enqueue(audio_file)
+    return audio_file
 
-    # Create the results dir and print debug info
-    output_dir = os.path.join(current_app.root_path,'static', 'results', str(file_id))
+@bp.route('/api/estimate')
+@login_required
+def estimate():
+    form = EstimateForm(request.args)
+    if not form.validate():
+        return jsonify({'error': 'Invalid parameters', 'errors': form.errors}), 400
     try:
-        print("Attempting to create directory:", os.path.abspath(output_dir))
-        os.makedirs(output_dir, exist_ok=True)
-        print("Directory exists after makedirs:", os.path.exists(output_dir))
-    except Exception as e:
-        print(f"ERROR: Unable to create directory {output_dir}: {e}")
-        flash("Server error: can't create output directory for results.", "error")
-        return redirect(url_for('main.dashboard'))
+        params = _processing_params(form)
+        params, cost, changes = admit(current_user.id, form.duration.data, params, current_app.config)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    return jsonify({
+        'seconds': round(cost['seconds'], 1),
+        'label': format_seconds(cost['seconds']),
+        'limit': current_app.config['COST_MAX_JOB_SECONDS'],
+        'changes': changes,
+        'params': {key: params[key] for key in ('n_components', 'max_iterations', 'sample_rate', 'n_restarts')},
+    })
 
-    spectrogram = create_spectrogram_plot(processing_result['D'], processing_result['sr'])
-    nmf_components = create_nmf_components_plot(processing_result['W'], processing_result['H'])
-    cluster_plot = create_cluster_plot(processing_result['labels'])
-    summary_plot = create_summary_plot(processing_result['results'])
-
-    print('Spectrogram success:', spectrogram.get('success'), '; Error:', spectrogram.get('error'))
-    print('NMF success:', nmf_components.get('success'), '; Error:', nmf_components.get('error'))
-    print('Cluster success:', cluster_plot.get('success'), '; Error:', cluster_plot.get('error'))
-    print('Summary success:', summary_plot.get('success'), '; Error:', summary_plot.get('error'))
-    print('Results data:', processing_result)
-
-    def save_b64_image(img_dict, filename):
-        if img_dict.get('success'):
-            img_b64 = img_dict['image']
-            out_path = os.path.join(output_dir, filename)
-            try:
-                with open(out_path, 'wb') as f:
-                    f.write(base64.b64decode(img_b64))
-                print('Saved image:', out_path)
-                return f"/static/results/{file_id}/{filename}"
-            except Exception as e:
-                print(f"ERROR: Saving {filename} failed: {e}")
-                return None
-        else:
-            print(f"Plot image {filename} not created due to failed generation.")
-            return None
-
-    spectrogram_path = save_b64_image(spectrogram, 'spectrogram.png')
-    nmf_path = save_b64_image(nmf_components, 'nmf_components.png')
-    cluster_path = save_b64_image(cluster_plot, 'cluster_plot.png')
-    summary_path = save_b64_image(summary_plot, 'summary_plot.png')
-
-    session[f'results_{file_id}'] = {
-        'processing_result': {
-            'sr': int(processing_result['sr']),
-            'results': processing_result['results']
-        },
-        'spectrogram_path': spectrogram_path,
-        'nmf_path': nmf_path,
-        'cluster_path': cluster_path,
-        'summary_path': summary_path,
+@bp.route('/api/uploads', methods=['POST'])
+@login_required
+def upload_init():
+    form = ChunkedUploadForm()
+    if not form.validate_on_submit():
+        return jsonify({'error': 'Invalid upload request', 'errors': form.errors}), 400
+    if form.size.data > current_app.config['MAX_UPLOAD_SIZE']:
+        return jsonify({'error': 'File is larger than the upload limit'}), 413
+    try:
+        params = _processing_params(form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    filename = secure_filename(form.filename.data)
+    unique_filename = f"{uuid.uuid4()}_{filename}"
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
+    open(file_path, 'wb').close()
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        original_filename=filename,
+        filename=unique_filename,
+        file_path=file_path,
+        total_size=form.size.data,
+        processing_params=json.dumps(params),
+        user_id=current_user.id
+    )
+    db.session.add(upload_session)
+    db.session.commit()
+    return jsonify(_upload_state(upload_session)), 201
+
+def _upload_session(upload_id):
+    return UploadSession.query.filter_by(id=upload_id, user_id=current_user.id).first_or_404()
+
+def _upload_state(upload_session):
+    return {
+        'upload_id': upload_session.id,
+        'size': upload_session.total_size,
+        'received': upload_session.received,
+        'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE'],
     }
-    audio_file.processed = True
+
+def _discard_upload(upload_session):
+    discard_partial(upload_session.id, upload_session.file_path)
+    db.session.delete(upload_session)
+    db.session.commit()
+
+@bp.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    return jsonify(_upload_state(_upload_session(upload_id)))
+
+@bp.route('/api/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    upload_session = _upload_session(upload_id)
+    offset = request.args.get('offset', type=int)
+    if offset != upload_session.received:
+        # Lost or repeated chunk; the client resumes from what was actually stored.
+        return jsonify({'error': 'Offset does not match the bytes received', **_upload_state(upload_session)}), 409
+    length = request.content_length
+    if not length or length > upload_session.total_size - offset:
+        return jsonify({'error': 'Chunk is empty or runs past the declared size'}), 400
+    head = b''
+    if offset == 0:
+        head = request.stream.read(HEADER_BYTES)
+        if not looks_like_audio(head):
+            _discard_upload(upload_session)
+            return jsonify({'error': 'Not a WAV, MP3 or FLAC file'}), 415
+    try:
+        written = write_chunk(upload_session.id, upload_session.file_path, offset, request.stream, length, head=head)
+    except OSError as e:
+        current_app.logger.error(f'Chunk write failed for upload {upload_id}: {e}')
+        return jsonify({'error': 'Could not store chunk', **_upload_state(upload_session)}), 500
+    upload_session.received = offset + written
+    db.session.commit()
+    return jsonify(_upload_state(upload_session))
+
+@bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def upload_cancel(upload_id):
+    _discard_upload(_upload_session(upload_id))
+    return '', 204
+
+@bp.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def upload_finalize(upload_id):
+    upload_session = _upload_session(upload_id)
+    if upload_session.received != upload_session.total_size:
+        return jsonify({'error': 'Upload is incomplete', **_upload_state(upload_session)}), 409
+    content_hash = finish_digest(upload_session.id, upload_session.file_path, upload_session.total_size)
+    try:
+        audio_file = _register_upload(upload_session.file_path, upload_session.filename, upload_session.original_filename,
+                                      upload_session.total_size, content_hash, json.loads(upload_session.processing_params))
+    except ValueError as e:
+        _discard_upload(upload_session)
+        return jsonify({'error': str(e)}), 422
+    db.session.delete(upload_session)
     db.session.commit()
-    flash('Audio processing completed successfully!', 'success')
-    return redirect(url_for('main.results', file_id=file_id))
+    return jsonify({'file_id': audio_file.id, 'redirect': url_for('main.process', file_id=audio_file.id)})
+
+@bp.route('/process/<int:file_id>')
+@login_required
+def process(file_id):
+    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
+    if audio_file.processed and audio_file.analysis:
+        return redirect(url_for('main.results', file_id=file_id))
+    job = jobs.latest_job(audio_file)
+    if job is None or (job.state in ('done', 'failed') and request.args.get('retry')):
+        with collect() as timings, stage('enqueue'):
+            job = jobs.enqueue(audio_file)
+        record_timings(timings)
+    return render_template('processing.html', audio_file=audio_file, job=job)
 
 @bp.route('/results/<int:file_id>')
 @login_required
@@ -226,12 +327,156 @@ def results(file_id):
     if not audio_file.processed:
         flash('File has not been processed yet.', 'warning')
         return redirect(url_for('main.process', file_id=file_id))
-    results_data = session.get(f'results_{file_id}')
-    if not results_data:
-        flash('Results not found. Please reprocess the file.', 'error')
-        return redirect(url_for('main.dashboard'))
+    if not audio_file.analysis:
+        flash('Results not found. Reprocessing the file.', 'warning')
+        return redirect(url_for('main.process', file_id=file_id, retry=1))
+    results_data = audio_file.analysis.to_results_data()
+    results_data['version'] = audio_file.analysis.version
+    results_data['plot_variants'] = {}
+    for key, kind in PLOTS:
+        results_data[key] = url_for('main.plot', file_id=file_id, kind=kind, v=audio_file.analysis.version)
+        variant_url = lambda width, fmt: url_for('main.plot_variant', file_id=file_id, kind=kind, width=width,
+                                                 fmt=fmt, v=audio_file.analysis.version)
+        results_data['plot_variants'][key] = {
+            fmt: ', '.join(f'{variant_url(width, fmt)} {width}w' for width in VARIANT_WIDTHS)
+            for fmt in VARIANT_FORMATS
+        }
+        results_data['plot_variants'][key]['src'] = variant_url(VARIANT_WIDTHS[1], 'png')
+    results_data['stems'] = {name: url_for('main.stem', file_id=file_id, name=name, v=audio_file.analysis.version)
+                             for name in STEMS}
     return render_template('results.html', audio_file=audio_file, results=results_data)
 
+@bp.route('/results/<int:file_id>/plot/<kind>.png')
+@login_required
+def plot(file_id, kind):
+    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
+    if kind not in PLOT_KINDS or not audio_file.analysis:
+        abort(404)
+    with collect() as timings:
+        outcome = ensure_plot(audio_file.analysis, kind)
+    if timings:
+        record_timings(timings)
+    if not outcome.get('success'):
+        current_app.logger.error(f'Rendering {kind} for file {file_id} failed: {outcome.get("error")}')
+        abort(404)
+    return _send_plot(outcome['path'], 'image/png')
+
+@bp.route('/results/<int:file_id>/plot/<kind>/<int:width>.<fmt>')
+@login_required
+def plot_variant(file_id, kind, width, fmt):
+    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
+    if kind not in PLOT_KINDS or width not in VARIANT_WIDTHS or fmt not in VARIANT_FORMATS or not audio_file.analysis:
+        abort(404)
+    with collect() as timings:
+        outcome = ensure_variant(audio_file.analysis, kind, width, fmt)
+    if timings:
+        record_timings(timings)
+    if not outcome.get('success'):
+        current_app.logger.error(f'Variant {kind}/{width}.{fmt} for file {file_id} failed: {outcome.get("error")}')
+        abort(404)
+    return _send_plot(outcome['path'], VARIANT_FORMATS[fmt])
+
+def _send_plot(path, mimetype):
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True,
+                         max_age=current_app.config['PLOT_CACHE_MAX_AGE'])
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+@bp.route('/results/<int:file_id>/audio/<name>.wav')
+@login_required
+def stem(file_id, name):
+    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
+    if name not in STEMS or not audio_file.analysis:
+        abort(404)
+    with collect() as timings, stage('reconstruct'):
+        outcome = ensure_stems(audio_file.analysis, audio_file, disk_cache('audio'))
+    record_timings(timings)
+    if not outcome.get('success'):
+        current_app.logger.error(f'Reconstructing {name} for file {file_id} failed: {outcome.get("error")}')
+        abort(404)
+    # conditional=True answers Range requests with 206 so players can seek without the whole file.
+    base_name = os.path.splitext(audio_file.original_filename)[0]
+    response = send_file(outcome['paths'][name], mimetype='audio/wav', conditional=True, etag=True,
+                         as_attachment=bool(request.args.get('download')),
+                         download_name=f'{base_name}_{name}.wav',
+                         max_age=current_app.config['PLOT_CACHE_MAX_AGE'])
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@bp.route('/api/results/<int:file_id>/export')
+@login_required
+def export_results(file_id):
+    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
+    analysis = audio_file.analysis
+    if not analysis:
+        abort(404)
+    names = request.args.get('arrays', ','.join(EXPORT_ARRAYS)).split(',')
+    compression = request.args.get('compression', 'deflate')
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    if not names or set(names) - set(EXPORT_ARRAYS):
+        return jsonify({'error': f'arrays must be a comma-separated subset of {", ".join(EXPORT_ARRAYS)}'}), 400
+    if compression not in COMPRESSIONS:
+        return jsonify({'error': f'compression must be one of {", ".join(COMPRESSIONS)}'}), 400
+    if compression == 'zstd' and zstd_compressor() is None:
+        return jsonify({'error': 'zstd export needs the zstandard package on the server'}), 400
+    if (start is not None and start < 0) or (start is not None and end is not None and end <= start):
+        return jsonify({'error': 'start must be >= 0 and end must be after start (seconds)'}), 400
+    n_components, n_frames = open_array(analysis, 'H').shape
+    try:
+        components = [int(c) for c in request.args['components'].split(',')] if request.args.get('components') \
+            else list(range(n_components))
+    except ValueError:
+        return jsonify({'error': 'components must be comma-separated component indices'}), 400
+    if not components or not all(0 <= c < n_components for c in components):
+        return jsonify({'error': f'components must be indices between 0 and {n_components - 1}'}), 400
+
+    first, stop = frame_window(start, end, analysis.sr, n_frames)
+    base_name = os.path.splitext(audio_file.original_filename)[0]
+    suffix = '.npz.zst' if compression == 'zstd' else '.npz'
+    response = Response(stream_with_context(stream_npz(
+        analysis, names, first, stop, components, compression, current_app.config['EXPORT_CHUNK_FRAMES']
+    )), mimetype='application/zstd' if compression == 'zstd' else 'application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{base_name}_frames{first}-{stop}{suffix}"'
+    response.cache_control.private = True
+    return response
+
+def _tile_root(file_id):
+    audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
+    if not audio_file.analysis:
+        abort(404)
+    root = tiles.tiles_dir(audio_file.analysis)
+    if tiles.load_meta(root) is None:
+        tiles.build_pyramid(open_array(audio_file.analysis, 'D'), root, audio_file.analysis.sr,
+                            mode=current_app.config['TILE_POOLING'])
+    return root
+
+@bp.route('/api/results/<int:file_id>/tiles')
+@login_required
+def tile_meta(file_id):
+    return jsonify(tiles.load_meta(_tile_root(file_id)))
+
+@bp.route('/api/results/<int:file_id>/tiles/<int:level>/<int:ty>/<int:tx>')
+@login_required
+def tile(file_id, level, ty, tx):
+    root = _tile_root(file_id)
+    meta = tiles.load_meta(root)
+    if level >= len(meta['levels']):
+        abort(404)
+    data = tiles.read_tile(root, level, ty, tx)
+    if data is None:
+        abort(404)
+    response = Response(data.tobytes(), mimetype='application/octet-stream',
+                        headers={'X-Tile-Shape': f'{data.shape[0]},{data.shape[1]}'})
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['PLOT_CACHE_MAX_AGE']
+    response.cache_control.immutable = True
+    response.add_etag()
+    return response.make_conditional(request)
+
 @bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
@@ -261,20 +506,52 @@ def profile():
 @bp.route('/files')
 @login_required
 def files():
-    page = request.args.get('page', 1, type=int)
-    files = AudioFile.query.filter_by(user_id=current_user.id).order_by(AudioFile.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    before = _parse_cursor(request.args.get('before'))
+    after = _parse_cursor(request.args.get('after')) if before is None else None
+    query = AudioFile.query.filter_by(user_id=current_user.id)
+    newest_first = (AudioFile.created_at.desc(), AudioFile.id.desc())
+    if after:
+        # Walk forward from the cursor, then flip back to newest-first for display.
+        query = query.filter(or_(AudioFile.created_at > after[0],
+                                 and_(AudioFile.created_at == after[0], AudioFile.id > after[1])))
+        rows = query.order_by(AudioFile.created_at, AudioFile.id).limit(FILES_PER_PAGE + 1).all()
+        items = rows[:FILES_PER_PAGE][::-1]
+        has_newer, has_older = len(rows) > FILES_PER_PAGE, True
+    else:
+        if before:
+            query = query.filter(or_(AudioFile.created_at < before[0],
+                                     and_(AudioFile.created_at == before[0], AudioFile.id < before[1])))
+        rows = query.order_by(*newest_first).limit(FILES_PER_PAGE + 1).all()
+        items = rows[:FILES_PER_PAGE]
+        has_newer, has_older = before is not None, len(rows) > FILES_PER_PAGE
+    files = {
+        'items': items,
+        'newer': _cursor(items[0]) if items and has_newer else None,
+        'older': _cursor(items[-1]) if items and has_older else None,
+    }
     return render_template('files.html', files=files)
 
+def _cursor(audio_file):
+    return f'{audio_file.created_at.isoformat()}_{audio_file.id}'
+
+def _parse_cursor(value):
+    try:
+        created_at, file_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(file_id)
+    except (AttributeError, ValueError):
+        return None
+
 @bp.route('/delete_file/<int:file_id>')
 @login_required
 def delete_file(file_id):
     audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
     try:
-        if os.path.exists(audio_file.file_path):
+        if os.path.exists(audio_file.file_path) and is_uploaded(audio_file.file_path, current_app.config['UPLOAD_FOLDER']):
             os.remove(audio_file.file_path)
+        if audio_file.analysis and release_result(audio_file.analysis):
+            shutil.rmtree(audio_file.analysis.result_dir, ignore_errors=True)
         db.session.delete(audio_file)
         db.session.commit()
-        session.pop(f'results_{file_id}', None)
         flash('File deleted successfully.', 'success')
     except Exception as e:
         flash('Failed to delete file.', 'error')
@@ -284,16 +561,75 @@ def delete_file(file_id):
 @bp.route('/api/upload_progress')
 @login_required
 def upload_progress():
-    return jsonify({'progress': 100})
+    upload_id = request.args.get('upload_id')
+    if upload_id:
+        upload_session = _upload_session(upload_id)
+    else:
+        upload_session = UploadSession.query.filter_by(user_id=current_user.id).order_by(UploadSession.updated_at.desc()).first()
+    if upload_session is None:
+        return jsonify({'progress': 100})
+    return jsonify({
+        'upload_id': upload_session.id,
+        'received': upload_session.received,
+        'size': upload_session.total_size,
+        'progress': round(upload_session.received / upload_session.total_size * 100, 1)
+    })
 
 @bp.route('/api/processing_status/<int:file_id>')
 @login_required
 def processing_status(file_id):
     audio_file = AudioFile.query.filter_by(id=file_id, user_id=current_user.id).first_or_404()
-    return jsonify({
+    status = {
         'processed': audio_file.processed,
         'created_at': audio_file.created_at.isoformat()
-    })
+    }
+    job = jobs.latest_job(audio_file)
+    if job:
+        status.update(jobs.job_status(job))
+    return jsonify(status)
+
+@bp.route('/api/processing_events')
+@login_required
+def processing_events():
+    file_ids = request.args.getlist('file_id', type=int)
+    user_id = current_user.id
+    min_interval = current_app.config['EVENTS_POLL_INTERVAL']
+    max_interval = current_app.config['EVENTS_POLL_MAX_INTERVAL']
+    deadline = time.monotonic() + current_app.config['EVENTS_STREAM_SECONDS']
+
+    # Job progress is written by worker processes, so the stream watches the job rows
+    # and pushes only what changed; clients reconnect when the stream times out. On
+    # PostgreSQL a trigger wakes the stream; elsewhere it polls, backing off while
+    # nothing changes.
+    def stream():
+        sent, last_write = {}, time.monotonic()
+        interval = min_interval
+        yield 'retry: 2000\n\n'
+        with jobs.job_notifications(user_id) as wait:
+            while time.monotonic() < deadline:
+                changed = False
+                for event in jobs.job_events(user_id, file_ids):
+                    if sent.get(event['file_id']) != event:
+                        sent[event['file_id']] = event
+                        changed = True
+                        last_write = time.monotonic()
+                        yield f'event: progress\ndata: {json.dumps(event)}\n\n'
+                db.session.rollback()
+                if time.monotonic() - last_write > 15:
+                    last_write = time.monotonic()
+                    yield ': keep-alive\n\n'
+                interval = min_interval if changed else min(interval * 2, max_interval)
+                if wait(min(interval, max(deadline - time.monotonic(), 0))):
+                    interval = min_interval
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 @bp.errorhandler(404)
 def not_found_error(error):
@@ -0,0 +1,111 @@
+from sqlalchemy import select, func
+from app import db
+from app.models import ProcessingJob, AudioFile
+from app.processor import N_FFT, HOP_LENGTH
+from app.solvers import DICTIONARY_SOLVERS
+
+# Nanoseconds per spectrogram cell per iteration, as (fixed, per component): the
+# elementwise work is paid once per cell, the matrix products once per component.
+# Measured single-threaded; COST_SPEED_FACTOR rescales them for other hardware.
+SOLVER_COST_NS = {
+    'mu': (27.7, 0.41),
+    'mu32': (3.8, 0.18),
+    'hals': (11.4, 0.06),
+    'sklearn': (17.0, 0.05),
+    'dict': (3.8, 0.18),
+    'dict-warm': (3.8, 0.18),
+}
+DOWNGRADE_SAMPLE_RATE = 16000
+DOWNGRADE_MIN_ITERATIONS = 500
+
+def estimate_cost(duration, params, speed_factor=1.0):
+    # Upper bound in CPU seconds: runs that converge under tol stop earlier.
+    sr = params['sample_rate']
+    frames = 1 + int(duration * sr) // HOP_LENGTH
+    bins = N_FFT // 2 + 1
+    fixed, per_component = SOLVER_COST_NS.get(params['solver'], SOLVER_COST_NS['mu'])
+    per_iteration = bins * frames * (fixed + per_component * params['n_components']) * 1e-9 * speed_factor
+    restarts = params.get('n_restarts') or 1
+    return {
+        'seconds': per_iteration * params['max_iterations'] * restarts,
+        'per_iteration': per_iteration,
+        'frames': frames,
+        'bins': bins,
+    }
+
+def fit_budget(duration, params, limit, speed_factor=1.0):
+    # Cheapest quality losses first: a lower sample rate (heart and lung sounds sit
+    # far below 8 kHz), then fewer restarts, then fewer iterations. Dictionaries are
+    # built per sample rate, so dictionary solvers keep theirs.
+    params, changes = dict(params), []
+    estimate = lambda: estimate_cost(duration, params, speed_factor)
+    if (estimate()['seconds'] > limit and params['sample_rate'] > DOWNGRADE_SAMPLE_RATE
+            and params['solver'] not in DICTIONARY_SOLVERS):
+        changes.append(f"sample rate {params['sample_rate']} → {DOWNGRADE_SAMPLE_RATE} Hz")
+        params['sample_rate'] = DOWNGRADE_SAMPLE_RATE
+    restarts = params.get('n_restarts') or 1
+    if estimate()['seconds'] > limit and restarts > 1:
+        single = estimate()['seconds'] / restarts
+        params['n_restarts'] = max(1, min(restarts, int(limit // single)))
+        changes.append(f"restarts {restarts} → {params['n_restarts']}")
+    cost = estimate()
+    if cost['seconds'] > limit and params['max_iterations'] > DOWNGRADE_MIN_ITERATIONS:
+        iterations = int(limit // (cost['per_iteration'] * (params.get('n_restarts') or 1)))
+        iterations = max(DOWNGRADE_MIN_ITERATIONS, iterations // 100 * 100)
+        changes.append(f"iterations {params['max_iterations']} → {iterations}")
+        params['max_iterations'] = iterations
+    return params, estimate(), changes
+
+def outstanding_cost(user_id):
+    return db.session.query(func.coalesce(func.sum(ProcessingJob.cost), 0.0)).join(AudioFile).filter(
+        AudioFile.user_id == user_id, ProcessingJob.state.in_(('queued', 'running'))
+    ).scalar()
+
+def admit(user_id, duration, params, config):
+    # Returns the params to run with, their estimate and any downgrades applied;
+    # raises ValueError when the work cannot be made to fit.
+    limit = config['COST_MAX_JOB_SECONDS']
+    speed = config['COST_SPEED_FACTOR']
+    cost = estimate_cost(duration, params, speed)
+    changes = []
+    if cost['seconds'] > limit:
+        if config['COST_OVER_BUDGET'] != 'downgrade':
+            raise ValueError(f"These settings need up to {format_seconds(cost['seconds'])} of processing; "
+                             f"the limit per file is {format_seconds(limit)}.")
+        params, cost, changes = fit_budget(duration, params, limit, speed)
+        if cost['seconds'] > limit:
+            raise ValueError(f"This recording needs up to {format_seconds(cost['seconds'])} of processing even "
+                             f"at reduced settings; the limit per file is {format_seconds(limit)}.")
+    queued = outstanding_cost(user_id)
+    if queued + cost['seconds'] > config['COST_MAX_USER_QUEUED_SECONDS']:
+        raise ValueError(f'You already have {format_seconds(queued)} of processing queued. '
+                         'Please wait for it to finish before adding more.')
+    return params, cost, changes
+
+def format_seconds(seconds):
+    if seconds < 90:
+        return f'{max(1, round(seconds))} s'
+    if seconds < 5400:
+        return f'{round(seconds / 60)} min'
+    return f'{seconds / 3600:.1f} h'
+
+def fair_candidates(claimable, now, max_running_per_user=None):
+    # Per-user fair queuing: each queued job's virtual finish time is its user's
+    # running cost plus the cost of that user's queued jobs up to and including it.
+    # Claiming in that order interleaves users by cost instead of submission order,
+    # and users already at the concurrency cap (if one is given) are skipped.
+    running = select(
+        AudioFile.user_id, func.count(ProcessingJob.id).label('jobs'), func.sum(ProcessingJob.cost).label('cost')
+    ).join(AudioFile).where(
+        ProcessingJob.state == 'running', ProcessingJob.lease_expires_at >= now
+    ).group_by(AudioFile.user_id).subquery()
+    waiting = select(
+        ProcessingJob.id, AudioFile.user_id,
+        func.sum(func.coalesce(ProcessingJob.cost, 0.0)).over(
+            partition_by=AudioFile.user_id, order_by=ProcessingJob.id).label('finish')
+    ).join(AudioFile).where(claimable).subquery()
+    rank = (waiting.c.finish + func.coalesce(running.c.cost, 0.0)).label('rank')
+    ranked = select(waiting.c.id, rank).outerjoin(running, running.c.user_id == waiting.c.user_id)
+    if max_running_per_user is not None:
+        ranked = ranked.where(func.coalesce(running.c.jobs, 0) < max_running_per_user)
+    return ranked.order_by(rank, waiting.c.id)
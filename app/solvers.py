@@ -0,0 +1,280 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+EPS = 1e-10
+
+def beta_divergence(V, WH, beta=1):
+    if beta == 2:
+        return float(0.5 * np.sum((V - WH) ** 2))
+    if beta == 1:
+        return float(np.sum(V * np.log((V + EPS) / (WH + EPS)) - V + WH))
+    if beta == 0:
+        ratio = (V + EPS) / (WH + EPS)
+        return float(np.sum(ratio - np.log(ratio) - 1))
+    return float(np.sum(
+        (V ** beta + (beta - 1) * WH ** beta - beta * V * WH ** (beta - 1)) / (beta * (beta - 1))
+    ))
+
+def random_init(V, n_components, rng):
+    rows, cols = V.shape
+    W = np.abs(rng.normal(0, 2.5, size=(rows, n_components)))
+    H = np.abs(rng.normal(0, 2.5, size=(n_components, cols)))
+    return W, H
+
+def _converged(prev_loss, loss, tol):
+    if prev_loss is None or not np.isfinite(prev_loss):
+        return False
+    return abs(prev_loss - loss) / max(abs(prev_loss), EPS) < tol
+
+def nmf_mu(V, n_components, max_iter, tol, check_every, rng, callback=None):
+    rows, cols = V.shape
+    W, H = random_init(V, n_components, rng)
+    loss, prev_loss, n_iter = None, None, 0
+    for n_iter in range(1, max_iter + 1):
+        H *= (W.T @ (V / (W @ H + EPS))) / (W.T @ np.ones((rows, cols)) + EPS)
+        W *= ((V / (W @ H + EPS)) @ H.T) / (np.ones((rows, cols)) @ H.T + EPS)
+        if n_iter % check_every == 0:
+            if callback:
+                callback(n_iter)
+            if tol > 0:
+                loss = beta_divergence(V, W @ H, beta=1)
+                if _converged(prev_loss, loss, tol):
+                    break
+                prev_loss = loss
+    if loss is None or n_iter % check_every:
+        loss = beta_divergence(V, W @ H, beta=1)
+    return {'W': W, 'H': H, 'n_iter': n_iter, 'loss': loss, 'loss_name': 'kullback-leibler'}
+
+def _kl_inplace(V, W, H, WH):
+    np.matmul(W, H, out=WH)
+    WH += EPS
+    total = WH.sum(dtype=np.float64) - V.sum(dtype=np.float64)
+    np.divide(V, WH, out=WH)
+    WH += EPS
+    np.log(WH, out=WH)
+    WH *= V
+    return float(total + WH.sum(dtype=np.float64))
+
+def nmf_mu32(V, n_components, max_iter, tol, check_every, rng, callback=None):
+    V = np.ascontiguousarray(V, dtype=np.float32)
+    W, H = random_init(V, n_components, rng)
+    return _mu32(V, W.astype(np.float32), H.astype(np.float32), max_iter, tol, check_every,
+                 callback=callback)
+
+def _mu32(V, W, H, max_iter, tol, check_every, update_from=0, callback=None):
+    rows, cols = V.shape
+    n_components = W.shape[1]
+    n_update = n_components - update_from
+    # Only columns from update_from on are learned; the rest of W stays fixed.
+    W_upd = W[:, update_from:]
+    H_upd = H[update_from:]
+
+    # Workspaces reused for every iteration; W.T @ ones and ones @ H.T
+    # reduce to column sums of W and row sums of H.
+    WH   = np.empty((rows, cols), dtype=np.float32)
+    numH = np.empty((n_components, cols), dtype=np.float32)
+    numW = np.empty((rows, n_update), dtype=np.float32)
+    denH = np.empty(n_components, dtype=np.float32)
+    denW = np.empty(n_update, dtype=np.float32)
+
+    loss, prev_loss, n_iter = None, None, 0
+    for n_iter in range(1, max_iter + 1):
+        np.matmul(W, H, out=WH)
+        WH += EPS
+        np.divide(V, WH, out=WH)
+        np.matmul(W.T, WH, out=numH)
+        np.sum(W, axis=0, out=denH)
+        denH += EPS
+        numH /= denH[:, None]
+        H *= numH
+
+        if n_update:
+            np.matmul(W, H, out=WH)
+            WH += EPS
+            np.divide(V, WH, out=WH)
+            np.matmul(WH, H_upd.T, out=numW)
+            np.sum(H_upd, axis=1, out=denW)
+            denW += EPS
+            numW /= denW
+            W_upd *= numW
+
+        if n_iter % check_every == 0:
+            if callback:
+                callback(n_iter)
+            if tol > 0:
+                loss = _kl_inplace(V, W, H, WH)
+                if _converged(prev_loss, loss, tol):
+                    break
+                prev_loss = loss
+    if loss is None or n_iter % check_every:
+        loss = _kl_inplace(V, W, H, WH)
+    return {'W': W, 'H': H, 'n_iter': n_iter, 'loss': loss, 'loss_name': 'kullback-leibler'}
+
+def nmf_dictionary(V, dictionary, n_free, max_iter, tol, check_every, rng, update_dictionary=False,
+                   callback=None):
+    V = np.ascontiguousarray(V, dtype=np.float32)
+    n_fixed = dictionary.shape[1]
+    W, H = random_init(V, n_fixed + n_free, rng)
+    W = W.astype(np.float32)
+    H = H.astype(np.float32)
+    # Templates are unit-sum spectra; put the free columns on the same scale
+    # and start H at the overall level of V.
+    W[:, :n_fixed] = dictionary
+    W[:, n_fixed:] /= W[:, n_fixed:].sum(axis=0) + EPS
+    H *= V.sum(dtype=np.float64) / max(float(W.sum(axis=0) @ H.sum(axis=1)), EPS)
+    fit = _mu32(V, W, H, max_iter, tol, check_every, update_from=0 if update_dictionary else n_fixed,
+                callback=callback)
+    fit['n_fixed'] = n_fixed
+    return fit
+
+def nmf_hals(V, n_components, max_iter, tol, check_every, rng, callback=None):
+    W, H = random_init(V, n_components, rng)
+    loss, prev_loss, n_iter = None, None, 0
+    for n_iter in range(1, max_iter + 1):
+        WtW = W.T @ W
+        WtV = W.T @ V
+        for k in range(n_components):
+            H[k] = np.maximum(EPS, H[k] + (WtV[k] - WtW[k] @ H) / (WtW[k, k] + EPS))
+        HHt = H @ H.T
+        VHt = V @ H.T
+        for k in range(n_components):
+            W[:, k] = np.maximum(EPS, W[:, k] + (VHt[:, k] - W @ HHt[:, k]) / (HHt[k, k] + EPS))
+        if n_iter % check_every == 0:
+            if callback:
+                callback(n_iter)
+            if tol > 0:
+                loss = beta_divergence(V, W @ H, beta=2)
+                if _converged(prev_loss, loss, tol):
+                    break
+                prev_loss = loss
+    if loss is None or n_iter % check_every:
+        loss = beta_divergence(V, W @ H, beta=2)
+    return {'W': W, 'H': H, 'n_iter': n_iter, 'loss': loss, 'loss_name': 'frobenius'}
+
+def nmf_sklearn(V, n_components, max_iter, tol, check_every, rng, callback=None):
+    # scikit-learn exposes no per-iteration hook; progress jumps straight to the end.
+    from sklearn.decomposition import NMF
+    model = NMF(
+        n_components=n_components, init='random', solver='mu',
+        beta_loss='kullback-leibler', max_iter=max_iter, tol=tol,
+        random_state=int(rng.integers(2**31 - 1))
+    )
+    W = model.fit_transform(V)
+    H = model.components_
+    if callback:
+        callback(int(model.n_iter_))
+    return {
+        'W': W, 'H': H, 'n_iter': int(model.n_iter_),
+        'loss': beta_divergence(V, W @ H, beta=1), 'loss_name': 'kullback-leibler'
+    }
+
+SOLVERS = {
+    'mu': nmf_mu,
+    'mu32': nmf_mu32,
+    'hals': nmf_hals,
+    'sklearn': nmf_sklearn,
+}
+
+# Solvers driven by a component dictionary; the flag says whether its templates are refined.
+DICTIONARY_SOLVERS = {
+    'dict': False,
+    'dict-warm': True,
+}
+
+def _proc_status_mb(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+def reset_peak_rss():
+    # Linux lets a process reset its RSS high-water mark, so a long-lived worker
+    # can report each job's own peak rather than the largest of any earlier job.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def rss_mb():
+    return _proc_status_mb('VmRSS')
+
+def peak_rss_mb(since_reset=False):
+    # Returns (megabytes, scope): 'job' after a successful reset_peak_rss(), otherwise
+    # 'process' for the worker's lifetime maximum from getrusage.
+    if since_reset:
+        peak = _proc_status_mb('VmHWM')
+        if peak is not None:
+            return peak, 'job'
+    if resource is None:
+        return None, None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 'process'
+
+def blas_limits(n_threads):
+    from threadpoolctl import threadpool_limits
+    return threadpool_limits(limits=n_threads, user_api='blas')
+
+def restart_rngs(seed, n_restarts):
+    # Restart 0 matches a single run with the same seed; the rest are spawned from it.
+    rngs = [np.random.default_rng(seed)]
+    rngs += [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(n_restarts - 1)]
+    return rngs
+
+def _best_of(run, rngs):
+    if len(rngs) == 1:
+        fits = [run(rngs[0])]
+    else:
+        # BLAS and the numpy ufuncs release the GIL, so restarts overlap on threads.
+        with ThreadPoolExecutor(max_workers=min(len(rngs), os.cpu_count() or 1)) as pool:
+            fits = list(pool.map(run, rngs))
+    losses = [fit['loss'] for fit in fits]
+    best = int(np.argmin(losses))
+    fit = fits[best]
+    fit['best_restart'] = best
+    fit['restart_losses'] = losses
+    return fit
+
+def run_nmf(V, n_components, max_iter, solver='mu', tol=1e-4, check_every=10, seed=None,
+            blas_threads=None, n_restarts=1, dictionary=None, n_free=2, callback=None):
+    check_every = max(1, check_every)
+    if solver in DICTIONARY_SOLVERS:
+        if dictionary is None:
+            raise ValueError(f'NMF solver {solver} needs a component dictionary')
+        run = lambda rng: nmf_dictionary(V, dictionary, n_free, max_iter, tol, check_every, rng,
+                                         update_dictionary=DICTIONARY_SOLVERS[solver], callback=callback)
+    elif solver in SOLVERS:
+        run = lambda rng: SOLVERS[solver](V, n_components, max_iter, tol, check_every, rng, callback=callback)
+    else:
+        raise ValueError(f'Unknown NMF solver: {solver}')
+    n_restarts = max(1, n_restarts)
+    rngs = restart_rngs(seed, n_restarts)
+    if not blas_threads and n_restarts > 1:
+        blas_threads = max(1, (os.cpu_count() or 1) // n_restarts)
+    reset = reset_peak_rss()
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    if blas_threads:
+        with blas_limits(blas_threads):
+            fit = _best_of(run, rngs)
+    else:
+        fit = _best_of(run, rngs)
+    fit['solver'] = solver
+    fit['n_restarts'] = n_restarts
+    fit['wall_time'] = time.perf_counter() - start
+    fit['time_per_iter'] = fit['wall_time'] / max(1, fit['n_iter'])
+    fit['peak_rss_mb'], fit['peak_rss_scope'] = peak_rss_mb(since_reset=reset)
+    fit['rss_mb'] = rss_mb()
+    fit['rss_delta_mb'] = fit['rss_mb'] - rss_before if rss_before is not None and fit['rss_mb'] is not None else None
+    return fit
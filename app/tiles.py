@@ -0,0 +1,82 @@
+import os
+import json
+import numpy as np
+
+TILE_SIZE = 256
+CHUNK_COLUMNS = 8192
+DB_FLOOR = -80.0
+
+def tiles_dir(analysis):
+    return os.path.join(analysis.result_dir, 'tiles')
+
+def _level_path(root, level):
+    return os.path.join(root, f'level_{level}.npy')
+
+def _pool(block, mode, fy, fx):
+    rows, cols = block.shape
+    pad_y, pad_x = -rows % fy, -cols % fx
+    if pad_y or pad_x:
+        block = np.pad(block, ((0, pad_y), (0, pad_x)), mode='edge')
+    pairs = block.reshape(block.shape[0] // fy, fy, block.shape[1] // fx, fx)
+    return pairs.max(axis=(1, 3)) if mode == 'max' else pairs.mean(axis=(1, 3))
+
+def _copy_level(source, out_path):
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float16, shape=source.shape)
+    for start in range(0, source.shape[1], CHUNK_COLUMNS):
+        out[:, start:start + CHUNK_COLUMNS] = source[:, start:start + CHUNK_COLUMNS]
+    out.flush()
+    return out
+
+def _pool_level(source, out_path, mode):
+    # Frequency stops being pooled once it fits in one tile; time keeps halving.
+    fy = 2 if source.shape[0] >= 2 * TILE_SIZE else 1
+    fx = 2 if source.shape[1] > TILE_SIZE else 1
+    rows, cols = -(-source.shape[0] // fy), -(-source.shape[1] // fx)
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float16, shape=(rows, cols))
+    for start in range(0, source.shape[1], CHUNK_COLUMNS):
+        block = np.asarray(source[:, start:start + CHUNK_COLUMNS], dtype=np.float32)
+        out[:, start // fx:start // fx + -(-block.shape[1] // fx)] = _pool(block, mode, fy, fx)
+    out.flush()
+    return out, fy, fx
+
+def build_pyramid(D, root, sr, hop_length=512, mode='max'):
+    os.makedirs(root, exist_ok=True)
+    level = _copy_level(D, _level_path(root, 0))
+    levels = [{'level': 0, 'shape': list(level.shape), 'scale': 1, 'freq_scale': 1}]
+    while level.shape[0] >= 2 * TILE_SIZE or level.shape[1] > TILE_SIZE:
+        n = len(levels)
+        level, fy, fx = _pool_level(level, _level_path(root, n), mode)
+        levels.append({
+            'level': n, 'shape': list(level.shape),
+            'scale': levels[-1]['scale'] * fx, 'freq_scale': levels[-1]['freq_scale'] * fy
+        })
+    meta = {
+        'tile_size': TILE_SIZE,
+        'sr': sr,
+        'hop_length': hop_length,
+        'n_frames': int(D.shape[1]),
+        'n_bins': int(D.shape[0]),
+        'mode': mode,
+        'db_range': [DB_FLOOR, 0.0],
+        'levels': levels
+    }
+    with open(os.path.join(root, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def load_meta(root):
+    path = os.path.join(root, 'meta.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def read_tile(root, level, ty, tx):
+    data = np.load(_level_path(root, level), mmap_mode='r')
+    y0, x0 = ty * TILE_SIZE, tx * TILE_SIZE
+    if y0 >= data.shape[0] or x0 >= data.shape[1] or ty < 0 or tx < 0:
+        return None
+    tile = np.asarray(data[y0:y0 + TILE_SIZE, x0:x0 + TILE_SIZE], dtype=np.float32)
+    # Quantize dB to one byte per cell for transfer.
+    scaled = (np.clip(tile, DB_FLOOR, 0.0) - DB_FLOOR) * (255.0 / -DB_FLOOR)
+    return np.round(scaled).astype(np.uint8)
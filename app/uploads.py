@@ -0,0 +1,101 @@
+import os
+import hashlib
+from datetime import datetime, timedelta
+
+CHUNK_SIZE = 1 << 20
+HEADER_BYTES = 12
+
+# Running sha256 per chunked upload, kept by the process that received the chunks.
+# Finalize falls back to rehashing the file when another process took some of them.
+_digests = {}
+
+def save_and_hash(file_storage, file_path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as out:
+        while True:
+            chunk = file_storage.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def hash_file(file_path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def looks_like_audio(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return True
+    if head[:4] == b'fLaC' or head[:3] == b'ID3':
+        return True
+    # Bare MPEG audio starts with an 11-bit frame sync.
+    return len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0
+
+def write_chunk(upload_id, file_path, offset, stream, max_bytes, head=b'', chunk_size=CHUNK_SIZE):
+    state = _digests.get(upload_id)
+    if offset == 0:
+        state = (0, hashlib.sha256())
+    elif state and state[0] != offset:
+        state = None
+    written = 0
+    with open(file_path, 'r+b') as out:
+        out.seek(offset)
+        out.truncate()
+        try:
+            chunk = head
+            while True:
+                if chunk:
+                    out.write(chunk)
+                    if state:
+                        state[1].update(chunk)
+                    written += len(chunk)
+                if written >= max_bytes:
+                    break
+                chunk = stream.read(min(chunk_size, max_bytes - written))
+                if not chunk:
+                    break
+        finally:
+            if state:
+                _digests[upload_id] = (offset + written, state[1])
+            else:
+                _digests.pop(upload_id, None)
+    return written
+
+def finish_digest(upload_id, file_path, size):
+    state = _digests.pop(upload_id, None)
+    if state and state[0] == size:
+        return state[1].hexdigest()
+    return hash_file(file_path)
+
+def discard_digest(upload_id):
+    _digests.pop(upload_id, None)
+
+def discard_partial(upload_id, file_path):
+    discard_digest(upload_id)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+def expire_uploads(max_age):
+    # Resumable uploads nobody came back to within max_age seconds: drop the
+    # session and the partial file, which can be as large as MAX_UPLOAD_SIZE.
+    from app import db
+    from app.models import UploadSession
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+    stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for upload_session in stale:
+        discard_partial(upload_session.id, upload_session.file_path)
+        db.session.delete(upload_session)
+    db.session.commit()
+    return len(stale)
+
+def is_uploaded(file_path, upload_folder):
+    # Only files we stored ourselves may be deleted; 'soundsep batch --register'
+    # points rows at the researcher's own dataset.
+    folder = os.path.realpath(upload_folder)
+    return os.path.commonpath([folder, os.path.realpath(file_path)]) == folder
@@ -1,85 +1,96 @@
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import librosa.display
 import numpy as np
 import io
-import base64
+import multiprocessing
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor
+from app.instrumentation import timed
 
 plt.style.use('seaborn-v0_8-darkgrid')
 
-def create_spectrogram_plot(D, sr):
+# Shared look for every plot, applied once per process instead of per figure.
+FACECOLOR = '#1a1a1a'
+PANEL_COLOR = '#2d2d2d'
+plt.rcParams.update({
+    'figure.facecolor': FACECOLOR,
+    'savefig.facecolor': FACECOLOR,
+    'savefig.bbox': 'tight',
+    'savefig.format': 'png',
+})
+
+_render_pool = None
+
+def _save(fig, out_path=None, dpi=None):
+    fig.tight_layout()
+    if out_path:
+        fig.savefig(out_path, dpi=dpi)
+        return {'success': True, 'path': out_path}
+    buf = io.BytesIO()
+    fig.savefig(buf, dpi=dpi)
+    return {'success': True, 'image': buf.getvalue()}
+
+@timed('render_spectrogram')
+def create_spectrogram_plot(D, sr, out_path=None):
     try:
-        fig, ax = plt.subplots(figsize=(12,8))
-        fig.patch.set_facecolor('#1a1a1a')
+        fig = Figure(figsize=(12,8))
+        ax = fig.subplots()
         img = librosa.display.specshow(D, y_axis='log', sr=sr, hop_length=512, x_axis='time', ax=ax, cmap='plasma')
         ax.set_title('Audio Spectrogram', color='w')
         ax.tick_params(colors='w')
         cbar = fig.colorbar(img, ax=ax, format='%+2.0f dB')
         cbar.ax.tick_params(colors='w')
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', facecolor='#1a1a1a', bbox_inches='tight')
-        buf.seek(0)
-        img_b64 = base64.b64encode(buf.read()).decode()
-        plt.close(fig)
-        return {'success': True, 'image': img_b64}
+        return _save(fig, out_path)
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-def create_nmf_components_plot(W, H):
+@timed('render_nmf_components')
+def create_nmf_components_plot(W, H, classes=None, out_path=None):
     try:
         n = W.shape[1]
-        fig, axs = plt.subplots(n, 2, figsize=(14, n*2.5))
-        fig.patch.set_facecolor('#1a1a1a')
-        if n == 1: axs = axs.reshape(1,-1)
+        fig = Figure(figsize=(14, n*2.5))
+        axs = fig.subplots(n, 2, squeeze=False)
         for i in range(n):
             axs[i,0].plot(W[:,i], color='#00d4ff')
             axs[i,1].plot(H[i], color='#00ff88')
+            if classes is not None:
+                axs[i,0].set_ylabel(f'{i}: {classes[i]}', color='w')
             for j in (0,1):
                 axs[i,j].tick_params(colors='w', labelsize=8)
-                axs[i,j].set_facecolor('#2d2d2d')
+                axs[i,j].set_facecolor(PANEL_COLOR)
         axs[0,0].set_title('Frequency Spectra (W)', color='w')
         axs[0,1].set_title('Temporal Activations (H)', color='w')
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', facecolor='#1a1a1a', bbox_inches='tight')
-        buf.seek(0)
-        img_b64 = base64.b64encode(buf.read()).decode()
-        plt.close(fig)
-        return {'success': True, 'image': img_b64}
+        return _save(fig, out_path)
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-def create_cluster_plot(labels):
+@timed('render_cluster_plot')
+def create_cluster_plot(labels, out_path=None):
     try:
-        fig, ax = plt.subplots(figsize=(12,6))
-        fig.patch.set_facecolor('#1a1a1a')
+        fig = Figure(figsize=(12,6))
+        ax = fig.subplots()
         ax.scatter(np.arange(len(labels)), labels, c=labels, cmap='viridis')
         ax.set_title('K-Means Clustering', color='w')
         ax.set_xlabel('Segment Index')
         ax.set_ylabel('Cluster')
+        ax.set_yticks([0, 1], ['Heart', 'Lung'])
         ax.tick_params(colors='w')
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', facecolor='#1a1a1a', bbox_inches='tight')
-        buf.seek(0)
-        img_b64 = base64.b64encode(buf.read()).decode()
-        plt.close(fig)
-        return {'success': True, 'image': img_b64}
+        return _save(fig, out_path)
     except Exception as e:
         return {'success': False, 'error': str(e)}
 
-def create_summary_plot(results):
+@timed('render_summary_plot')
+def create_summary_plot(results, out_path=None):
     try:
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 10))
-        fig.patch.set_facecolor('#1a1a1a')
+        fig = Figure(figsize=(15, 10))
+        ((ax1, ax2), (ax3, ax4)) = fig.subplots(2, 2)
         cluster_counts = [results['cluster_0_count'], results['cluster_1_count']]
         colors = ['#00d4ff', '#00ff88']
 
-        ax1.set_facecolor('#2d2d2d')
+        ax1.set_facecolor(PANEL_COLOR)
         bars = ax1.bar(['Heart Sounds', 'Lung Sounds'], cluster_counts, color=colors, alpha=0.8)
         ax1.set_title('Sound Classification Distribution', color='white', fontsize=12)
         ax1.set_ylabel('Number of Segments', color='white')
@@ -87,7 +98,7 @@ def create_summary_plot(results):
         for bar, count in zip(bars, cluster_counts):
             ax1.text(bar.get_x() + bar.get_width()/2., bar.get_height(), f'{count}', ha='center', va='bottom', color='white')
 
-        ax2.set_facecolor('#2d2d2d')
+        ax2.set_facecolor(PANEL_COLOR)
         params = ['Components', 'Sample Rate (kHz)', 'Duration (s)']
         values = [results['n_components'], results['sr']/1000, results['duration']]
         bars2 = ax2.bar(params, values, color=['#ff6b6b', '#4ecdc4', '#45b7d1'], alpha=0.8)
@@ -96,7 +107,7 @@ def create_summary_plot(results):
         for bar, value in zip(bars2, values):
             ax2.text(bar.get_x() + bar.get_width()/2., bar.get_height(), f'{value:.1f}', ha='center', va='bottom', color='white')
 
-        ax3.set_facecolor('#2d2d2d')
+        ax3.set_facecolor(PANEL_COLOR)
         ratios = [results['cluster_ratio'], 1 - results['cluster_ratio']]
         labels_pie = ['Heart Sounds', 'Lung Sounds']
         wedges, texts, autotexts = ax3.pie(ratios, labels=labels_pie, colors=colors, autopct='%1.1f%%', startangle=90)
@@ -107,7 +118,7 @@ def create_summary_plot(results):
             autotext.set_color('white')
             autotext.set_fontweight('bold')
 
-        ax4.set_facecolor('#2d2d2d')
+        ax4.set_facecolor(PANEL_COLOR)
         matrix_info = [
             f"W Matrix: {results['W_shape'][0]} × {results['W_shape'][1]}",
             f"H Matrix: {results['H_shape']} × {results['H_shape'][1]}",
@@ -119,13 +130,33 @@ def create_summary_plot(results):
         ax4.set_xlim(0, 1)
         ax4.set_ylim(0, 1)
         ax4.axis('off')
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', facecolor='#1a1a1a', bbox_inches='tight', dpi=100)
-        buf.seek(0)
-        img_b64 = base64.b64encode(buf.read()).decode()
-        plt.close(fig)
-        return {'success': True, 'image': img_b64}
+        return _save(fig, out_path, dpi=100)
     except Exception as e:
         return {'success': False, 'error': str(e)}
+
+RENDERERS = {
+    'spectrogram': create_spectrogram_plot,
+    'nmf_components': create_nmf_components_plot,
+    'cluster_plot': create_cluster_plot,
+    'summary_plot': create_summary_plot,
+}
+
+def _render_task(task):
+    kind, args, out_path = task
+    return RENDERERS[kind](*args, out_path=out_path)
+
+def _get_render_pool(max_workers):
+    global _render_pool
+    if _render_pool is None:
+        # Separate processes, since matplotlib is not thread-safe.
+        _render_pool = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')
+        )
+        # atexit does not run inside pool workers; shut down via multiprocessing's hooks.
+        Finalize(None, _render_pool.shutdown, exitpriority=100)
+    return _render_pool
+
+def render_plots(tasks, max_workers=4):
+    if max_workers <= 1 or len(tasks) <= 1:
+        return [_render_task(task) for task in tasks]
+    return list(_get_render_pool(max_workers).map(_render_task, tasks))
@@ -0,0 +1,157 @@
+"""Micro-benchmarks for the processing and visualization hot paths.
+
+    python -m benchmarks.bench                  # run and compare to baseline
+    python -m benchmarks.bench --save-baseline  # record a new baseline
+    python -m benchmarks.bench --durations 5,60,600 --filter nmf
+    python -m benchmarks.bench --require-baseline   # in CI: missing baseline fails
+
+Each benchmark reports the median wall time over --repeat runs and the
+peak traced allocation of a single run. Results slower (or larger) than
+the baseline by more than --threshold fail the run.
+
+The committed baseline.json holds the default run (--durations 5,60
+--sample-rates 16000) on one core of an Intel Xeon VM (Haswell-class,
+OpenBLAS 0.3.31, 5 GB RAM) with Python 3.11, numpy 2.4, librosa 0.11,
+scikit-learn 1.9 and matplotlib 3.11. Wall times only compare on similar
+hardware; re-record with --save-baseline on the machine that runs the check.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import statistics
+import numpy as np
+import soundfile as sf
+
+from benchmarks.signals import heart_lung_signal
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+NMF_GRID = [(4, 200), (8, 200), (8, 1000), (16, 200)]
+SOLVERS = ('mu', 'mu32', 'hals')
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': statistics.median(times), 'peak_mb': peak / 1024**2}
+
+def build_cases(durations, sample_rates, workdir):
+    import librosa
+    from app.processor import compute_features, cluster_activations
+    from app.solvers import run_nmf
+    from app import visualizer
+
+    cases = {}
+    for duration in durations:
+        for sr in sample_rates:
+            tag = f'{duration:g}s@{sr}'
+            y = heart_lung_signal(duration, sr)
+            wav_path = os.path.join(workdir, f'{duration}_{sr}.wav')
+            sf.write(wav_path, heart_lung_signal(duration, 44100), 44100)
+            magnitude, D = compute_features(y)
+            V = magnitude + 1e-10
+            fit = run_nmf(V, 8, 200, solver='mu32', tol=0, seed=0)
+            W, H = fit['W'], fit['H']
+            labels = cluster_activations(H)
+            metrics = {
+                'sr': sr, 'duration': duration, 'n_components': 8,
+                'W_shape': W.shape, 'H_shape': H.shape, 'D_shape': D.shape,
+                'cluster_0_count': int(np.sum(labels == 0)),
+                'cluster_1_count': int(np.sum(labels == 1)),
+                'cluster_ratio': float(np.mean(labels == 0)),
+            }
+
+            cases[f'decode[{tag}]'] = lambda p=wav_path, s=sr: librosa.load(p, sr=s)
+            cases[f'stft[{tag}]'] = lambda y=y: compute_features(y)
+            for solver in SOLVERS:
+                for n_components, max_iter in NMF_GRID:
+                    cases[f'nmf_{solver}[{tag},k={n_components},it={max_iter}]'] = (
+                        lambda V=V, k=n_components, it=max_iter, s=solver:
+                            run_nmf(V, k, it, solver=s, tol=0, seed=0)
+                    )
+            cases[f'kmeans[{tag}]'] = lambda H=H: cluster_activations(H)
+            cases[f'plot_spectrogram[{tag}]'] = lambda D=D, sr=sr: visualizer.create_spectrogram_plot(D, sr)
+            cases[f'plot_nmf_components[{tag}]'] = lambda W=W, H=H: visualizer.create_nmf_components_plot(W, H)
+            cases[f'plot_cluster[{tag}]'] = lambda labels=labels: visualizer.create_cluster_plot(labels)
+            cases[f'plot_summary[{tag}]'] = lambda m=metrics: visualizer.create_summary_plot(m)
+    return cases
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ('time', 'peak_mb'):
+            if base[key] > 0 and result[key] > base[key] * threshold:
+                regressions.append(f'{name}: {key} {base[key]:.4g} -> {result[key]:.4g} '
+                                   f'({result[key] / base[key]:.2f}x)')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--durations', default='5,60', help='Signal durations in seconds.')
+    parser.add_argument('--sample-rates', default='16000', help='Analysis sample rates.')
+    parser.add_argument('--filter', default='', help='Only run benchmarks containing this text.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='Allowed slowdown/growth factor relative to the baseline.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--require-baseline', action='store_true',
+                        help='Fail when there is no baseline, or no entry for a benchmark that ran.')
+    parser.add_argument('--output', help='Also write results as JSON here.')
+    args = parser.parse_args(argv)
+
+    durations = [float(d) for d in args.durations.split(',')]
+    sample_rates = [int(s) for s in args.sample_rates.split(',')]
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = build_cases(durations, sample_rates, workdir)
+        for name, func in cases.items():
+            if args.filter not in name:
+                continue
+            results[name] = measure(func, args.repeat)
+            print(f"{name:<60} {results[name]['time'] * 1000:10.2f} ms {results[name]['peak_mb']:10.2f} MB",
+                  flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print('No baseline found; run with --save-baseline to record one.')
+        return 1 if args.require_baseline else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    missing = [name for name in results if name not in baseline]
+    for name in missing:
+        print(f'NO BASELINE {name}')
+    return 1 if regressions or (args.require_baseline and missing) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
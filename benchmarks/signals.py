@@ -0,0 +1,25 @@
+import numpy as np
+
+def heart_lung_signal(duration, sr, seed=0, bpm=72, breaths_per_min=15):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+
+    # Heart: S1/S2 tone bursts around 40-120 Hz at a steady rate.
+    heart = np.zeros_like(t)
+    beat = 60.0 / bpm
+    for onset, freq, width in ((0.0, 55.0, 0.10), (0.30, 85.0, 0.08)):
+        phase = (t - onset) % beat
+        envelope = np.exp(-0.5 * ((phase - width / 2) / (width / 4)) ** 2)
+        heart += envelope * np.sin(2 * np.pi * freq * t)
+
+    # Lung: broadband noise shaped to 100-1000 Hz, modulated by breathing.
+    noise = rng.normal(size=t.size)
+    spectrum = np.fft.rfft(noise)
+    freqs = np.fft.rfftfreq(t.size, 1 / sr)
+    spectrum[(freqs < 100) | (freqs > 1000)] = 0
+    lung = np.fft.irfft(spectrum, n=t.size)
+    lung /= np.abs(lung).max() or 1.0
+    lung *= 0.5 * (1 + np.sin(2 * np.pi * breaths_per_min / 60.0 * t))
+
+    y = heart + 0.4 * lung + 0.01 * rng.normal(size=t.size)
+    return (y / np.abs(y).max()).astype(np.float32)
@@ -6,5 +6,44 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///soundseparator.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = 'static/uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024   # 16 MB
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024   # 16 MB, per request
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 1024**3))   # chunked uploads
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+    UPLOAD_SESSION_MAX_AGE = int(os.environ.get('UPLOAD_SESSION_MAX_AGE', 24 * 3600))   # seconds idle
+    UPLOAD_EXPIRE_INTERVAL = 600   # seconds between sweeps by an idle worker
     PERMANENT_SESSION_LIFETIME = timedelta(hours=1)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR', 'local')   # local pool, or 'worker' hosts
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+    JOB_HEARTBEAT_INTERVAL = JOB_LEASE_SECONDS / 3
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    WORKER_POLL_INTERVAL = 1.0
+    JOB_MAX_RUNNING_PER_USER = int(os.environ.get('JOB_MAX_RUNNING_PER_USER', 2))
+    COST_MAX_JOB_SECONDS = float(os.environ.get('COST_MAX_JOB_SECONDS', 900))   # estimated CPU seconds
+    COST_MAX_USER_QUEUED_SECONDS = float(os.environ.get('COST_MAX_USER_QUEUED_SECONDS', 3600))
+    COST_OVER_BUDGET = os.environ.get('COST_OVER_BUDGET', 'downgrade')   # or 'reject'
+    COST_SPEED_FACTOR = float(os.environ.get('COST_SPEED_FACTOR', 1.0))
+    CACHE_FOLDER = os.environ.get('CACHE_FOLDER') or 'cache'
+    AUDIO_CACHE_MAX_BYTES = int(os.environ.get('AUDIO_CACHE_MAX_BYTES', 2 * 1024**3))
+    FEATURES_CACHE_MAX_BYTES = int(os.environ.get('FEATURES_CACHE_MAX_BYTES', 4 * 1024**3))
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 500))
+    NUMBA_CACHE_DIR = os.environ.get('NUMBA_CACHE_DIR') or os.path.join(CACHE_FOLDER, 'numba')
+    PREWARM_WORKERS = os.environ.get('PREWARM_WORKERS', 'true').lower() in ('1', 'true', 'yes')
+    NMF_SEED = 0
+    PLOT_WORKERS = int(os.environ.get('PLOT_WORKERS', 4))
+    PLOTS_EAGER = os.environ.get('PLOTS_EAGER', '').lower() in ('1', 'true', 'yes')
+    PLOT_CACHE_MAX_AGE = 365 * 24 * 3600
+    TILE_POOLING = os.environ.get('TILE_POOLING', 'max')
+    ARTIFACT_CHUNK_FRAMES = int(os.environ.get('ARTIFACT_CHUNK_FRAMES', 4096))
+    ARTIFACT_D_ENCODING = os.environ.get('ARTIFACT_D_ENCODING', 'float16')   # float32, float16 or q8
+    ARTIFACT_COMPRESS = os.environ.get('ARTIFACT_COMPRESS', '').lower() in ('1', 'true', 'yes')
+    EXPORT_CHUNK_FRAMES = 8192   # frames read and sent per piece of a streamed export
+    NMF_TOL = 1e-4
+    NMF_CHECK_EVERY = 10
+    JOB_PROGRESS_INTERVAL = 0.5   # seconds between NMF iteration updates
+    EVENTS_POLL_INTERVAL = 1.0        # seconds; doubles while nothing changes
+    EVENTS_POLL_MAX_INTERVAL = 8.0    # also the fallback wake-up when LISTEN/NOTIFY is used
+    EVENTS_STREAM_SECONDS = 300
+    NMF_BLAS_THREADS = int(os.environ.get('NMF_BLAS_THREADS', 0)) or None
+    DICTIONARY_FOLDER = os.environ.get('DICTIONARY_FOLDER') or 'dictionary'
+    DICTIONARY_FREE_COMPONENTS = int(os.environ.get('DICTIONARY_FREE_COMPONENTS', 2))
@@ -0,0 +1,26 @@
+"""job iteration
+
+Revision ID: 0c9d4e7b2a61
+Revises: f3b7e9a24c18
+Create Date: 2026-10-17 15:48:20.611934
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c9d4e7b2a61'
+down_revision = 'f3b7e9a24c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('iteration', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.drop_column('iteration')
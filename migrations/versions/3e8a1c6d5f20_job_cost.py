@@ -0,0 +1,26 @@
+"""job cost
+
+Revision ID: 3e8a1c6d5f20
+Revises: 9d6b2f8e4a13
+Create Date: 2026-10-17 17:24:41.902153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a1c6d5f20'
+down_revision = '9d6b2f8e4a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cost', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.drop_column('cost')
@@ -0,0 +1,42 @@
+"""processing jobs
+
+Revision ID: 4c7e2b9d1f03
+Revises: 1a2a6925391c
+Create Date: 2026-10-17 09:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7e2b9d1f03'
+down_revision = '1a2a6925391c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('processing_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('state', sa.String(length=20), nullable=False),
+    sa.Column('stage', sa.String(length=50), nullable=True),
+    sa.Column('progress', sa.Float(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('audio_file_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['audio_file_id'], ['audio_file.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_processing_job_state'), ['state'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_processing_job_state'))
+
+    op.drop_table('processing_job')
@@ -0,0 +1,43 @@
+"""job notify trigger
+
+Revision ID: 5b2e7d9c1a48
+Revises: 3e8a1c6d5f20
+Create Date: 2026-10-17 21:08:13.517402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e7d9c1a48'
+down_revision = '3e8a1c6d5f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PostgreSQL only: progress streams LISTEN for '<user_id>:<file_id>' instead of polling.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_processing_job() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('processing_job',
+                (SELECT user_id FROM audio_file WHERE id = NEW.audio_file_id) || ':' || NEW.audio_file_id);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER processing_job_notify
+        AFTER INSERT OR UPDATE OF state, stage, progress, iteration ON processing_job
+        FOR EACH ROW EXECUTE FUNCTION notify_processing_job()
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP TRIGGER IF EXISTS processing_job_notify ON processing_job')
+    op.execute('DROP FUNCTION IF EXISTS notify_processing_job()')
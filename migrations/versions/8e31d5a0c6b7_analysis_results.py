@@ -0,0 +1,44 @@
+"""analysis results
+
+Revision ID: 8e31d5a0c6b7
+Revises: 4c7e2b9d1f03
+Create Date: 2026-10-17 10:02:15.640922
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e31d5a0c6b7'
+down_revision = '4c7e2b9d1f03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('analysis_result',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('result_dir', sa.String(length=500), nullable=False),
+    sa.Column('arrays_path', sa.String(length=500), nullable=False),
+    sa.Column('sr', sa.Integer(), nullable=True),
+    sa.Column('metrics', sa.Text(), nullable=True),
+    sa.Column('spectrogram_path', sa.String(length=255), nullable=True),
+    sa.Column('nmf_path', sa.String(length=255), nullable=True),
+    sa.Column('cluster_path', sa.String(length=255), nullable=True),
+    sa.Column('summary_path', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('audio_file_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['audio_file_id'], ['audio_file.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('audio_file_id')
+    )
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.drop_column('result')
+
+
+def downgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('result', sa.Text(), nullable=True))
+
+    op.drop_table('analysis_result')
@@ -0,0 +1,32 @@
+"""job leases
+
+Revision ID: 9d6b2f8e4a13
+Revises: 7a1f5c3e9b42
+Create Date: 2026-10-17 16:52:09.318407
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d6b2f8e4a13'
+down_revision = '7a1f5c3e9b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lease_owner', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner')
@@ -0,0 +1,48 @@
+"""result memoization
+
+Revision ID: b5f09a3e7d21
+Revises: 8e31d5a0c6b7
+Create Date: 2026-10-17 11:20:51.307284
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5f09a3e7d21'
+down_revision = '8e31d5a0c6b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_stat',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('misses', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('audio_file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_audio_file_content_hash'), ['content_hash'], unique=False)
+
+    with op.batch_alter_table('analysis_result', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_key', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('hit_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_used_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_analysis_result_cache_key'), ['cache_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_result', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_analysis_result_cache_key'))
+        batch_op.drop_column('last_used_at')
+        batch_op.drop_column('hit_count')
+        batch_op.drop_column('cache_key')
+
+    with op.batch_alter_table('audio_file', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_audio_file_content_hash'))
+        batch_op.drop_column('content_hash')
+
+    op.drop_table('cache_stat')
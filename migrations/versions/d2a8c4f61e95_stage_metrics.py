@@ -0,0 +1,35 @@
+"""stage metrics
+
+Revision ID: d2a8c4f61e95
+Revises: b5f09a3e7d21
+Create Date: 2026-10-17 13:41:07.902516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8c4f61e95'
+down_revision = 'b5f09a3e7d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stage_metric',
+    sa.Column('stage', sa.String(length=50), nullable=False),
+    sa.Column('le', sa.String(length=10), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('stage', 'le')
+    )
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('timings', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('processing_job', schema=None) as batch_op:
+        batch_op.drop_column('timings')
+
+    op.drop_table('stage_metric')
@@ -0,0 +1,28 @@
+"""audio file user indexes
+
+Revision ID: f3b7e9a24c18
+Revises: d2a8c4f61e95
+Create Date: 2026-10-17 15:02:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7e9a24c18'
+down_revision = 'd2a8c4f61e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('audio_file', schema=None) as batch_op:
+        batch_op.create_index('ix_audio_file_user_id_created_at', ['user_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_audio_file_user_id_processed', ['user_id', 'processed'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('audio_file', schema=None) as batch_op:
+        batch_op.drop_index('ix_audio_file_user_id_processed')
+        batch_op.drop_index('ix_audio_file_user_id_created_at')
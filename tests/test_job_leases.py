@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+from datetime import datetime, timedelta
+
+import pytest
+
+# Config reads the environment once, at import. TEST_DATABASE_URL points the suite
+# at a shared server (e.g. postgresql://...); otherwise it uses a throwaway SQLite file.
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or \
+    'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='soundsep-test-'), 'jobs.db')
+os.environ['JOB_EXECUTOR'] = 'worker'
+os.environ['JOB_MAX_RUNNING_PER_USER'] = '8'
+os.environ['PREWARM_WORKERS'] = 'false'
+
+from app import create_app, db, jobs, pipeline   # noqa: E402
+from app.models import User, AudioFile, AnalysisResult, ProcessingJob   # noqa: E402
+
+WORKERS = 4
+FILES_PER_USER = 5
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def fake_pipeline(log_path):
+    # Stands in for NMF: records which process ran which file, then stores an empty result.
+    def run_pipeline(audio_file, progress=None, on_iteration=None):
+        with open(log_path, 'a') as f:
+            f.write(f'{audio_file.id} {os.getpid()}\n')
+        time.sleep(0.05)
+        analysis = AnalysisResult(audio_file_id=audio_file.id, result_dir='', arrays_path='')
+        db.session.add(analysis)
+        return {'success': True, 'analysis': analysis}
+    return run_pipeline
+
+def add_jobs(n_users, files_per_user, state='queued'):
+    jobs_added = []
+    for u in range(n_users):
+        user = User(username=f'user{u}', email=f'user{u}@example.org', first_name='Test', last_name=str(u))
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(files_per_user):
+            audio_file = AudioFile(filename=f'{u}_{i}.wav', original_filename=f'{u}_{i}.wav',
+                                   file_path=f'/nonexistent/{u}_{i}.wav', content_hash=f'{u:032x}{i:032x}',
+                                   duration=10.0, user_id=user.id, processing_params=json.dumps({
+                                       'n_components': 4, 'max_iterations': 200, 'sample_rate': 16000,
+                                       'solver': 'mu32'}))
+            db.session.add(audio_file)
+            db.session.flush()
+            job = ProcessingJob(audio_file_id=audio_file.id, state=state, stage=state, progress=0.0, cost=1.0)
+            db.session.add(job)
+            jobs_added.append(job)
+    db.session.commit()
+    return jobs_added
+
+def _work(owner):
+    app = create_app()
+    with app.app_context():
+        jobs.work(owner, burst=True)
+
+def expire(job_id):
+    ProcessingJob.query.filter_by(id=job_id).update({
+        'state': 'running', 'lease_owner': 'crashed:1', 'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+
+def test_each_job_runs_exactly_once_across_workers(app, tmp_path, monkeypatch):
+    log_path = tmp_path / 'runs.log'
+    monkeypatch.setattr(pipeline, 'run_pipeline', fake_pipeline(log_path))
+    file_ids = sorted(job.audio_file_id for job in add_jobs(3, FILES_PER_USER))
+    db.session.remove()
+
+    # Forked workers inherit the patched pipeline and each open their own engine.
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_work, args=(f'worker-{i}',)) for i in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    runs = [line.split() for line in log_path.read_text().splitlines()]
+    assert sorted(int(file_id) for file_id, _ in runs) == file_ids
+    assert len({pid for _, pid in runs}) > 1
+    finished = ProcessingJob.query.all()
+    assert all(job.state == 'done' and job.attempts == 1 for job in finished)
+    assert {job.lease_owner for job in finished} <= {f'worker-{i}' for i in range(WORKERS)}
+
+def test_expired_lease_is_reclaimed(app):
+    job, = add_jobs(1, 1)
+    job_id = job.id
+    assert jobs.claim_next('first') == job_id
+    assert jobs.claim_next('second') is None   # the lease is still live
+
+    expire(job_id)
+    assert jobs.claim_next('second') == job_id
+    job = db.session.get(ProcessingJob, job_id)
+    assert job.state == 'running'
+    assert job.lease_owner == 'second'
+    assert job.attempts == 2
+    assert job.lease_expires_at > datetime.utcnow()
+
+def test_job_fails_after_max_attempts(app):
+    job, = add_jobs(1, 1)
+    job_id = job.id
+    max_attempts = app.config['JOB_MAX_ATTEMPTS']
+    for attempt in range(1, max_attempts + 1):
+        assert jobs.claim_next(f'worker-{attempt}') == job_id
+        assert db.session.get(ProcessingJob, job_id).attempts == attempt
+        expire(job_id)
+
+    assert jobs.claim_next('last') is None
+    db.session.expire_all()
+    job = db.session.get(ProcessingJob, job_id)
+    assert job.state == 'failed'
+    assert job.attempts == max_attempts
+    assert 'lease expired' in job.error
+
+def test_file_with_a_live_job_is_not_claimed_twice(app):
+    job, = add_jobs(1, 1)
+    assert jobs.claim_next('first') == job.id
+    retry = ProcessingJob(audio_file_id=job.audio_file_id, state='queued', stage='queued', progress=0.0, cost=1.0)
+    db.session.add(retry)
+    db.session.commit()
+    assert jobs.claim_next('second') is None
+
+    expire(job.id)
+    assert jobs.claim_next('second') in (job.id, retry.id)
+    assert jobs.claim_next('third') is None